@@ -0,0 +1,107 @@
+
+from typing import Dict
+from threading import Lock
+
+from app.monitoring import RateLimiter, Counters
+
+import time
+import app
+
+# Maximum amount of concurrent connections per ip address
+MAX_CONNECTIONS_PER_IP = 16
+
+# Token bucket for new connections per ip address
+CONNECT_RATE_LIMIT = 10
+CONNECT_RATE_PERIOD = 10
+CONNECT_RATE_COOLDOWN = 30
+
+# Global accept rate, to shed load while we are overloaded
+ACCEPT_RATE_LIMIT = 500
+ACCEPT_RATE_PERIOD = 1
+ACCEPT_RATE_COOLDOWN = 1
+
+# Idle rate limiters get removed, once we track this many
+MAX_TRACKED_ADDRESSES = 2**14
+
+class AdmissionControl:
+    """
+    Decides whether a new connection should be accepted, before any protocol
+    object is created for it. Connections are limited per ip address, by both
+    concurrent connections and connect rate, as well as by a global accept rate.
+    """
+
+    def __init__(self) -> None:
+        self.connections: Dict[str, int] = {}
+        self.limiters: Dict[str, RateLimiter] = {}
+        self.accept_limiter = RateLimiter(
+            ACCEPT_RATE_LIMIT,
+            ACCEPT_RATE_PERIOD,
+            ACCEPT_RATE_COOLDOWN
+        )
+        self.counters = Counters(
+            'accepted', 'blocked', 'connection_limit',
+            'rate_limited', 'overloaded'
+        )
+        self.lock = Lock()
+
+    def __repr__(self) -> str:
+        return f'<AdmissionControl ({len(self.connections)} addresses)>'
+
+    def admit(self, address: str) -> bool:
+        if address in app.session.blocked_connections:
+            app.session.logger.warning(f'Blocked connection from {address}')
+            self.counters.increment('blocked')
+            return False
+
+        with self.lock:
+            if self.connections.get(address, 0) >= MAX_CONNECTIONS_PER_IP:
+                self.counters.increment('connection_limit')
+                return False
+
+            limiter = self.limiter(address)
+
+            if not limiter.allow():
+                self.counters.increment('rate_limited')
+                return False
+
+            if not self.accept_limiter.allow():
+                # Shedding load should not count against this address
+                self.counters.increment('overloaded')
+                limiter.refund()
+                return False
+
+            self.connections[address] = self.connections.get(address, 0) + 1
+            self.counters.increment('accepted')
+            return True
+
+    def release(self, address: str) -> None:
+        with self.lock:
+            count = self.connections.get(address, 0) - 1
+
+            if count > 0:
+                self.connections[address] = count
+                return
+
+            self.connections.pop(address, None)
+
+    def limiter(self, address: str) -> RateLimiter:
+        if limiter := self.limiters.get(address):
+            return limiter
+
+        if len(self.limiters) >= MAX_TRACKED_ADDRESSES:
+            self.remove_idle_limiters()
+
+        self.limiters[address] = limiter = RateLimiter(
+            CONNECT_RATE_LIMIT,
+            CONNECT_RATE_PERIOD,
+            CONNECT_RATE_COOLDOWN
+        )
+        return limiter
+
+    def remove_idle_limiters(self) -> None:
+        """Remove rate limiters that would have been fully replenished by now"""
+        cutoff = time.monotonic() - CONNECT_RATE_PERIOD - CONNECT_RATE_COOLDOWN
+
+        for address, limiter in list(self.limiters.items()):
+            if limiter.last_check < cutoff and address not in self.connections:
+                del self.limiters[address]
@@ -2,12 +2,12 @@
 from app.objects.channel import Channel, MultiplayerChannel
 from app.commands import Context, Command, commands, sets
 from app.common.config import config_instance as config
-from app.common.helpers import permissions
 from app.common.database import messages
 from app.clients.irc import IrcClient
 from app.clients.base import Client
 
-from typing import Tuple, List, Iterable
+from typing import Tuple, List, Iterable, Set
+from functools import cached_property
 from collections import defaultdict
 from chio import Message
 
@@ -24,6 +24,16 @@ class BanchoBot(IrcClient):
         self.presence.country_index = 1
         self.logged_in = True
 
+    @cached_property
+    def command_permissions(self) -> Set[str]:
+        """All permissions that are checked when resolving & running commands"""
+        return {
+            'bancho.matches.bypass_limit',
+            'bancho.matches.force_ref',
+            *(command.permission for command in commands),
+            *(command.permission for set in sets for command in set.commands)
+        }
+
     def process_and_send_response(
         self,
         message: str,
@@ -78,12 +88,7 @@ class BanchoBot(IrcClient):
             if ctx.trigger.lower() not in command.triggers:
                 continue
 
-            has_permission = permissions.has_permission(
-                permission=command.permission,
-                user_id=ctx.player.id
-            )
-
-            if not has_permission:
+            if not ctx.player.has_permission(command.permission):
                 return
 
             return command
@@ -102,12 +107,7 @@ class BanchoBot(IrcClient):
                 if trigger.lower() not in command.triggers:
                     continue
 
-                has_permission = permissions.has_permission(
-                    permission=command.permission,
-                    user_id=ctx.player.id
-                )
-
-                if not has_permission:
+                if not ctx.player.has_permission(command.permission):
                     continue
 
                 ctx.trigger = trigger
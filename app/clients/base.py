@@ -1,7 +1,10 @@
 
 from chio.types import UserPresence, UserStats, UserStatus, Message, UserQuit
-from typing import Iterable, List, Set, TYPE_CHECKING
+from typing import Callable, Dict, FrozenSet, Iterable, Set, TYPE_CHECKING
+from twisted.internet.base import DelayedCall
 from chio.constants import Mode, Permissions
+from twisted.internet import reactor
+from sqlalchemy.orm import Session
 from datetime import datetime
 from threading import Lock
 
@@ -9,12 +12,13 @@ if TYPE_CHECKING:
     from app.objects.channel import Channel
 
 from app.common.helpers import location, permissions, infringements as infringements_helper
-from app.common.database.objects import DBUser, DBStats
+from app.common.database.objects import DBUser, DBStats, DBRelationship
 from app.common.config import config_instance as config
 from app.common.cache import leaderboards, status
 from app.objects.client import ClientHash
 from app.objects.multiplayer import Match
 from app.common.constants import level
+from app.helpers import fetch_geolocation, utc_offset
 from app.monitoring import RateLimiter
 from app.common.database import (
     infringements,
@@ -26,7 +30,6 @@ from app.common.database import (
 
 import timeago
 import logging
-import pytz
 import time
 import app
 
@@ -60,8 +63,14 @@ class Client:
         self.message_limiter = RateLimiter(60, 60)
         self.invite_limiter = RateLimiter(10, 20)
         self.action_lock = Lock()
+        self.permission_cache: Dict[str, bool] = {}
+        self.expiry_timers: Dict[str, DelayedCall] = {}
+        self.expiry_timers_cancelled = False
+        self.restriction_state: bool | None = None
+        self.friends: FrozenSet[int] = frozenset()
+        self.blocked: FrozenSet[int] = frozenset()
         self.logged_in = False
-        self.hidden = False
+        self.hidden_state = False
         self.rankings = {}
 
     @property
@@ -88,12 +97,8 @@ class Client:
         if not self.object.silence_end:
             return False
 
-        if self.remaining_silence < 0:
-            # User is not silenced anymore
-            self.unsilence(expired=True)
-            return False
-
-        return True
+        # Expired silences are lifted by the "silence" expiry timer
+        return self.remaining_silence >= 0
 
     @property
     def remaining_silence(self) -> int:
@@ -116,23 +121,11 @@ class Client:
         if not self.object.restricted:
             return False
 
-        if not (recent := infringements.fetch_recent_by_action(self.id, action=0)):
-            self.unrestrict()
-            return False
-
-        if recent.is_permanent:
-            return True
-
-        if not recent.length:
-            return True
-
-        remaining = (recent.length - datetime.now()).total_seconds()
+        if self.restriction_state is None:
+            # Restriction state is cached until the next reload
+            self.restriction_state = self.load_restriction()
 
-        if remaining <= 0:
-            self.unrestrict()
-            return False
-
-        return True
+        return self.restriction_state
 
     @property
     def is_bot(self) -> bool:
@@ -148,20 +141,6 @@ class Client:
             if self.object and self.object.stats else None
         )
 
-    @property
-    def friends(self) -> List[int]:
-        return [
-            rel.target_id for rel in self.object.relationships
-            if rel.status == 0
-        ]
-
-    @property
-    def blocked(self) -> List[int]:
-        return [
-            rel.target_id for rel in self.object.relationships
-            if rel.status == 1
-        ]
-
     @property
     def online_friends(self) -> Iterable["Client"]:
         for id in self.friends:
@@ -211,6 +190,21 @@ class Client:
 
         return ""
 
+    @property
+    def hidden(self) -> bool:
+        return self.hidden_state
+
+    @hidden.setter
+    def hidden(self, value: bool) -> None:
+        if value == self.hidden_state:
+            return
+
+        self.hidden_state = value
+
+        if self.logged_in:
+            # Encoded presence bundles need to be updated
+            app.session.players.update_visibility(self)
+
     @property
     def permissions(self) -> Permissions:
         return self.presence.permissions
@@ -236,7 +230,7 @@ class Client:
 
     @property
     def has_preview_access(self) -> bool:
-        return permissions.has_permission('clients.validation.bypass', self.id)
+        return self.has_permission('clients.validation.bypass')
 
     @property
     def is_channel(self) -> bool:
@@ -274,21 +268,41 @@ class Client:
         with app.session.database.managed_session(autocommit=False) as session:
             self.object = users.fetch_by_id(
                 self.id,
-                DBUser.target_relationships,
-                DBUser.relationships,
                 DBUser.groups,
                 DBUser.stats,
                 session=session
             )
             self.update_object(mode)
+            self.update_relationships(session)
             self.update_geolocation()
             self.update_status_cache()
             self.reload_rankings()
             self.reload_rank()
             group_permissions = groups.fetch_bancho_permissions(self.id, session)
             self.presence.permissions = Permissions(group_permissions)
+            self.reload_permissions()
             return self.object
 
+    def has_permission(self, permission: str) -> bool:
+        """Check a permission of the player, which is cached until their permissions change"""
+        if (result := self.permission_cache.get(permission)) is not None:
+            return result
+
+        # Permission was not resolved by reload_permissions
+        result = bool(permissions.has_permission(permission, self.id))
+        self.permission_cache[permission] = result
+        return result
+
+    def reload_permissions(self) -> None:
+        """Resolve every permission that commands & logins check, and replace the cache at once"""
+        names = {'clients.validation.bypass', *app.session.banchobot.command_permissions}
+
+        # The old results stay in use until all permissions are resolved
+        self.permission_cache = {
+            permission: bool(permissions.has_permission(permission, self.id))
+            for permission in names
+        }
+
     def reload_rank(self) -> None:
         """Check if redis rank desynced from database and update it, if needed"""
         cached_rank = leaderboards.global_rank(self.id, self.status.mode.value)
@@ -337,11 +351,129 @@ class Client:
     def apply_default_ranking(self) -> None:
         self.stats.rank = self.current_stats.rank
 
+    def update_relationships(self, session: Session) -> None:
+        """
+        Rebuild the friend & block indexes from the database. The relationship rows
+        are not kept on the user object, so that these indexes, which are updated by
+        add_friend & remove_friend, are the only copy of the player's relationships.
+        """
+        rows = session.query(DBRelationship.target_id, DBRelationship.status) \
+            .filter(DBRelationship.user_id == self.id) \
+            .all()
+
+        self.friends = frozenset(
+            target_id for target_id, status in rows
+            if status == 0
+        )
+        self.blocked = frozenset(
+            target_id for target_id, status in rows
+            if status == 1
+        )
+        app.session.players.friend_index.update(self)
+
+    def add_friend(self, target_id: int) -> None:
+        self.friends = self.friends | {target_id}
+        app.session.players.friend_index.update(self)
+
+    def remove_friend(self, target_id: int) -> None:
+        self.friends = self.friends - {target_id}
+        app.session.players.friend_index.update(self)
+
+    def load_restriction(self) -> bool:
+        """Check the most recent restriction & schedule its expiry"""
+        if not (recent := infringements.fetch_recent_by_action(self.id, action=0)):
+            self.unrestrict()
+            return False
+
+        if recent.is_permanent:
+            return True
+
+        if not recent.length:
+            return True
+
+        remaining = (recent.length - datetime.now()).total_seconds()
+
+        if remaining <= 0:
+            self.unrestrict()
+            return False
+
+        self.schedule_expiry('restriction', remaining, self.on_restriction_expired)
+        return True
+
+    def schedule_expiry(self, name: str, delay: float, callback: Callable) -> None:
+        """Call a function once an infringement has expired, replacing the previous timer"""
+        reactor.callFromThread(self.start_expiry_timer, name, delay, callback)
+
+    def start_expiry_timer(self, name: str, delay: float, callback: Callable) -> None:
+        if self.expiry_timers_cancelled:
+            # Client has disconnected before the timer was armed
+            return
+
+        self.stop_expiry_timer(name)
+        self.expiry_timers[name] = reactor.callLater(
+            max(delay, 0),
+            app.session.tasks.do_later,
+            callback,
+            priority=2
+        )
+
+    def stop_expiry_timer(self, name: str) -> None:
+        if (timer := self.expiry_timers.pop(name, None)) and timer.active():
+            timer.cancel()
+
+    def stop_expiry_timers(self) -> None:
+        for name in list(self.expiry_timers):
+            self.stop_expiry_timer(name)
+
+    def cancel_expiry_timers(self) -> None:
+        """Cancel all expiry timers, including ones that are still being armed"""
+        self.expiry_timers_cancelled = True
+        reactor.callFromThread(self.stop_expiry_timers)
+
+    def update_silence_expiry(self) -> None:
+        if not self.object.silence_end:
+            reactor.callFromThread(self.stop_expiry_timer, 'silence')
+            return
+
+        self.schedule_expiry(
+            'silence',
+            self.object.silence_end.timestamp() - time.time(),
+            self.on_silence_expired
+        )
+
+    def on_silence_expired(self) -> None:
+        # Timers are armed during the login already, so
+        # this may run before the client has logged in
+        if not self.object:
+            return
+
+        if not self.object.silence_end:
+            return
+
+        if self.object.silence_end > datetime.now():
+            # Silence was extended in the meantime
+            return self.update_silence_expiry()
+
+        self.unsilence(expired=True)
+
+    def on_restriction_expired(self) -> None:
+        if not self.object:
+            return
+
+        if not self.object.restricted:
+            return
+
+        # Re-check, in case the restriction was changed in the meantime
+        self.restriction_state = self.load_restriction()
+
     def update_object(self, mode: int = 0) -> None:
         """Apply the current database object to the client"""
         self.id = self.object.id
         self.name = self.object.name
         self.status.mode = Mode(mode)
+        self.restriction_state = None
+        self.update_silence_expiry()
+        reactor.callFromThread(self.stop_expiry_timer, 'restriction')
 
         if not self.object.stats:
             return
@@ -360,7 +492,7 @@ class Client:
 
     def update_geolocation(self) -> None:
         """Updates the player's geolocation"""
-        self.location = location.fetch_geolocation(self.address)
+        self.location = fetch_geolocation(self.address)
 
         if location.is_local_ip(self.address):
             # This is not a very elegant solution, but should
@@ -370,11 +502,7 @@ class Client:
         self.presence.country_index = self.location.country_index
         self.presence.longitude = self.location.longitude
         self.presence.latitude = self.location.latitude
-        self.presence.timezone = int(
-            datetime.now(
-                pytz.timezone(self.location.timezone)
-            ).utcoffset().total_seconds() / 60 / 60
-        )
+        self.presence.timezone = utc_offset(self.location.timezone)
 
     def update_leaderboard_stats(self) -> None:
         """Updates the player's stats inside the redis leaderboard"""
@@ -1,6 +1,6 @@
 
 from chio import Permissions, LoginError, UserQuit, Message, QuitState
-from typing import List, Any, Iterable, TYPE_CHECKING
+from typing import List, Dict, Tuple, Any, Iterable, TYPE_CHECKING
 from twisted.words.protocols import irc
 from twisted.internet import reactor
 from functools import cached_property
@@ -16,11 +16,15 @@ from app.common.constants import UserActivity, strings
 from app.common.helpers import activity
 from app.common.cache import status
 from app.clients.base import Client
+from app import tracing
 
 import logging
 import time
 import app
 
+# Formatted message lines, which are shared across recipients of a message
+LineCache = Dict[Tuple[str, str], bytes]
+
 class IrcClient(Client):
     def __init__(self, address: str, port: int):
         super().__init__(address, port)
@@ -45,7 +49,8 @@ class IrcClient(Client):
             self.enqueue_command(irc.ERR_UNKNOWNCOMMAND, command, ":Unknown command")
             return
 
-        return handler(self, prefix, *params)
+        with tracing.span('irc.command', command=command, user_id=self.id):
+            return handler(self, prefix, *params)
 
     def on_login_received(self) -> None:
         if self.logged_in:
@@ -75,16 +80,16 @@ class IrcClient(Client):
             self.object = user
             self.name = user.name
             self.update_object(user.preferred_mode)
+            self.update_relationships(session)
             self.update_geolocation()
 
-            # Preload relationships
-            self.object.target_relationships
-            self.object.relationships
+            # Preload groups
             self.object.groups
 
             # Reload permissions
             group_permissions = groups.fetch_bancho_permissions(self.id, session)
             self.presence.permissions = Permissions(group_permissions)
+            self.reload_permissions()
 
             if self.restricted:
                 self.logger.warning('Login Failed: Restricted')
@@ -207,6 +212,7 @@ class IrcClient(Client):
 
     def close_connection(self, reason: Any = None) -> None:
         self.connected = False
+        self.cancel_expiry_timers()
 
         if reason is not None:
             self.logger.info(f'Closing connection -> <{self.address}> ({reason})')
@@ -357,7 +363,7 @@ class IrcClient(Client):
     def enqueue_message(self, message: str, sender: "Client", target: str) -> None:
         self.logger.debug(f"<- <{target}> '{message}' ({sender})")
 
-    def enqueue_message_object(self, message: Message) -> None:
+    def enqueue_message_object(self, message: Message, lines: LineCache | None = None) -> None:
         self.logger.debug(f"<- <{message.target}> '{message.content}' ({message.sender})")
 
     def enqueue_banchobot_message(self, message: str) -> None:
@@ -566,8 +572,10 @@ class IrcClient(Client):
 
         # Send topic first, then names listing after a small delay
         # This ensures the client processes them in the correct order
-        reactor.callLater(0.1, enqueue_topic)
-        reactor.callLater(0.2, enqueue_names)
+        # Note that this may be called from any thread, so the timers
+        # have to be scheduled from inside the reactor thread
+        reactor.callFromThread(reactor.callLater, 0.1, enqueue_topic)
+        reactor.callFromThread(reactor.callLater, 0.2, enqueue_names)
 
     def enqueue_channel_revoked(self, channel: str) -> None:
         self.enqueue_command(irc.ERR_NOSUCHCHANNEL, channel, ":No such channel")
@@ -3,13 +3,15 @@ from chio.constants import LoginError, QuitState, Permissions, PresenceFilter
 from chio.types import UserQuit, Message, TitleUpdate, ReplayFrameBundle
 from chio import PacketType, BanchoIO
 
+from sqlalchemy.orm import Session, joinedload
 from typing import Any, Iterable, Deque
-from sqlalchemy.orm import Session
 from datetime import datetime
 from collections import deque
+from sqlalchemy import func
 from copy import copy
 
 from app.common.database import users, groups, stats, logins, clients, releases
+from app.common.database.objects import DBUser
 from app.common.helpers import activity, clients as client_utils
 from app.common.constants import GameMode, UserActivity
 from app.common.config import config_instance as config
@@ -23,6 +25,7 @@ from app.objects.client import OsuClientInformation
 from app.objects.multiplayer import Match
 from app.objects.locks import LockedSet
 from app.clients import Client
+from app import tracing
 
 import hashlib
 import logging
@@ -40,6 +43,7 @@ class OsuClient(Client):
         self.spectators: LockedSet[OsuClient] = LockedSet()
         self.spectator_frame_backlog: Deque[ReplayFrameBundle] = deque()
         self.spectator_backlog_active: bool = False
+        self.status_update_pending: bool = False
         self.info: OsuClientInformation = OsuClientInformation.empty()
         self.io: BanchoIO = chio.select_latest_client()
 
@@ -75,6 +79,7 @@ class OsuClient(Client):
     def __repr__(self) -> str:
         return f'<{self.protocol.capitalize()}OsuClient "{self.name}" ({self.id})>'
 
+    @tracing.traced('osu.login')
     def on_login_received(
         self,
         username: str,
@@ -123,29 +128,32 @@ class OsuClient(Client):
         )
 
         with app.session.database.managed_session() as session:
-            if not (user := users.fetch_by_name_case_insensitive(username, session)):
+            with tracing.child_span('login.fetch'):
+                user = self.fetch_user(username, session)
+
+            if not user:
                 self.logger.warning('Login Failed: User not found')
                 self.on_login_failed(LoginError.InvalidLogin)
                 return
 
-            if not login_manager.check_password(password, user.bcrypt):
+            with tracing.child_span('login.password'):
+                authenticated = login_manager.check_password(password, user.bcrypt, user.id)
+
+            if not authenticated:
                 self.logger.warning('Login Failed: Authentication error')
                 self.on_login_failed(LoginError.InvalidLogin)
                 return
 
             self.object = user
             self.update_object(user.preferred_mode)
+            self.update_relationships(session)
             self.update_geolocation()
 
-            # Preload relationships
-            self.object.target_relationships
-            self.object.relationships
-            self.object.groups
-            self.object.stats
-
             # Reload permissions
-            group_permissions = groups.fetch_bancho_permissions(self.id, session)
-            self.presence.permissions = Permissions(group_permissions)
+            with tracing.child_span('login.permissions'):
+                group_permissions = groups.fetch_bancho_permissions(self.id, session)
+                self.presence.permissions = Permissions(group_permissions)
+                self.reload_permissions()
 
             if self.restricted:
                 self.logger.warning('Login Failed: Restricted')
@@ -169,7 +177,9 @@ class OsuClient(Client):
 
             # Check client version & executable hash
             unverified_client_warning = ""
-            valid, response_message = self.is_valid_client(session)
+
+            with tracing.child_span('login.verification'):
+                valid, response_message = self.is_valid_client(session)
 
             if not valid:
                 unverified_client_warning = response_message + ' Scores submitted with this client will not be accepted.'
@@ -209,7 +219,8 @@ class OsuClient(Client):
                 self.enqueue_infringement_length(-1)
 
             # Check for new hardware & multiaccounting
-            self.check_hardware_info(session)
+            with tracing.child_span('login.hardware'):
+                self.check_hardware_info(session)
 
             if self.object.country.upper() == 'XX':
                 # We failed to get the users country on registration
@@ -222,7 +233,8 @@ class OsuClient(Client):
                 self.info.friendonly_dms = self.object.friendonly_dms
 
             # Update rank, status & rankings
-            self.update_cache()
+            with tracing.child_span('login.cache'):
+                self.update_cache()
 
             # Create login attempt in db
             app.session.tasks.do_later(
@@ -233,7 +245,8 @@ class OsuClient(Client):
                 priority=4
             )
 
-            activity.submit(
+            app.session.tasks.do_later(
+                activity.submit,
                 self.id, None,
                 UserActivity.UserLogin,
                 {
@@ -243,11 +256,13 @@ class OsuClient(Client):
                     'version': self.info.version.string
                 },
                 is_hidden=True,
-                session=session
+                priority=4
             )
 
         self.logged_in = True
-        self.on_login_success()
+
+        with tracing.child_span('login.success'):
+            self.on_login_success()
 
         if unverified_client_warning:
             # User logged in with a client that was not whitelisted / approved
@@ -265,7 +280,7 @@ class OsuClient(Client):
         self.update_activity_later()
         self.enqueue_packet(PacketType.BanchoLoginReply, self.id)
         self.enqueue_packet(PacketType.BanchoLoginPermissions, self.permissions)
-        self.enqueue_packet(PacketType.BanchoFriendsList, self.friends)
+        self.enqueue_packet(PacketType.BanchoFriendsList, list(self.friends))
 
         # Menu Icon
         self.enqueue_packet(
@@ -281,10 +296,7 @@ class OsuClient(Client):
         self.enqueue_stats(self)
 
         # Enqueue other players
-        app.session.tasks.do_later(
-            self.enqueue_players,
-            app.session.players
-        )
+        app.session.tasks.do_later(self.enqueue_all_players)
 
         # Append to player collection
         app.session.players.add(self)
@@ -357,10 +369,11 @@ class OsuClient(Client):
             self.logger.warning(f'Could not find a handler function for "{packet}".')
             return
 
-        if data is None:
-            return handler_function(self)
+        with tracing.span('osu.packet', packet=packet.name, user_id=self.id):
+            if data is None:
+                return handler_function(self)
 
-        return handler_function(self, data)
+            return handler_function(self, data)
 
     def on_user_restricted(
         self,
@@ -373,11 +386,14 @@ class OsuClient(Client):
         self.close_connection("Restricted")
 
     def close_connection(self, reason: str = "") -> None:
+        self.cancel_expiry_timers()
+
         if not self.logged_in:
             return
 
         self.logged_in = False
         self.spectator_backlog_active = False
+        self.status_update_pending = False
         app.session.players.remove(self)
         app.session.channels.remove(self.spectator_chat)
 
@@ -426,6 +442,17 @@ class OsuClient(Client):
             priority=2
         )
 
+    def fetch_user(self, username: str, session: Session) -> DBUser | None:
+        """Fetch a user by name, including the groups & stats that the login reads"""
+        # Relationships are loaded separately, see "update_relationships"
+        return session.query(DBUser) \
+            .options(
+                joinedload(DBUser.groups),
+                joinedload(DBUser.stats)
+            ) \
+            .filter(func.lower(DBUser.name) == username.lower()) \
+            .first()
+
     def is_valid_client(self, session: Session) -> tuple[bool, str]:
         if len(self.info.version.string) > 25:
             # Version is too long to be saved in database
@@ -443,13 +470,27 @@ class OsuClient(Client):
         if config.BANCHO_CLIENT_CUTOFF and self.info.version.date > config.BANCHO_CLIENT_CUTOFF:
             return False, strings.CLIENT_TOO_NEW
 
+        # Executables are shared by many players, so the result is cached
+        is_valid = login_manager.verify_client(
+            self.info.version.identifier,
+            self.info.version.date,
+            self.info.hash.md5,
+            lambda: self.is_valid_executable(session)
+        )
+
+        if not is_valid:
+            return False, strings.UNVERIFIED_CLIENT
+
+        return True, ""
+
+    def is_valid_executable(self, session: Session) -> bool:
         is_official_release = releases.official_file_exists(
             self.info.hash.md5,
             session=session
         )
 
         if is_official_release:
-            return True, ""
+            return True
 
         valid_identifiers = (
             'stable', 'test', 'tourney', 'cuttingedge', 'beta'
@@ -462,13 +503,13 @@ class OsuClient(Client):
                 self.info.version.date,
                 self.info.hash.md5,
                 session=session
-            ), strings.UNVERIFIED_CLIENT
+            )
 
         return client_utils.is_valid_mod(
             self.info.version.identifier,
             self.info.hash.md5,
             session=session
-        ), strings.UNVERIFIED_CLIENT
+        )
 
     def check_hardware_info(self, session: Session) -> None:
         if not self.info.supports_client_hash:
@@ -691,6 +732,18 @@ class OsuClient(Client):
     def enqueue_players(self, players: Iterable["Client"]) -> None:
         self.enqueue_presence_bundle(players)
 
+    def enqueue_all_players(self) -> None:
+        if self.io.version < 20121224:
+            # Presences are sent one by one, which depend on our ranking
+            return self.enqueue_presence_bundle(app.session.players)
+
+        for data in app.session.players.presence.packets(self):
+            self.enqueue(data, PacketType.BanchoUserPresenceBundle)
+
+        if self.hidden:
+            # Hidden players are left out of the shared bundle, but still see themselves
+            self.enqueue_packet(PacketType.BanchoUserPresenceBundle, [self])
+
     def enqueue_presence_single(self, player: "Client") -> None:
         if player.hidden:
             return
@@ -18,13 +18,16 @@ from chio import (
 
 from app.common.cache import leaderboards
 from app.common.database.repositories import *
-from app.common.helpers import infringements, permissions
+from app.common.helpers import infringements
 
 from app.objects.channel import Channel, MultiplayerChannel, PythonInterpreterChannel
 from app.objects.multiplayer import Match, MatchTimer
 from app.common.constants import EventType, GameMode
 from app.handlers.osu import spectator
+from app.objects.blocklist import BLOCKLIST_REDIS_KEY
 from app.clients.base import Client
+from app import helpers, tracing
+from app.tasks.logins import manager as login_manager
 from app.session import config
 from app.faq import faq
 
@@ -150,6 +153,72 @@ def status(ctx: Context) -> List[str]:
         f"  Packets: {app.session.packets_per_minute.rate} / min",
     ]
 
+@system_commands.register(['metrics', 'stats'], "admin")
+def metrics(ctx: Context) -> List[str]:
+    """- Retrieve networking metrics"""
+    tcp_buffers = [player.outbound for player in app.session.players.tcp_osu_clients]
+    tcp_writes = sum(buffer.total_writes for buffer in tcp_buffers)
+    tcp_flushes = sum(buffer.total_flushes for buffer in tcp_buffers)
+
+    irc_buffers = [
+        player.outbound for player in app.session.players.irc_clients
+        if hasattr(player, 'outbound')
+    ]
+    irc_writes = sum(buffer.total_writes for buffer in irc_buffers)
+    irc_flushes = sum(buffer.total_flushes for buffer in irc_buffers)
+    irc_peak_depth = max((buffer.peak_depth for buffer in irc_buffers), default=0)
+
+    http_clients = len(app.session.players.http_osu_clients)
+    http_requests = app.session.http_requests_per_minute.rate
+    longpoll = app.session.http_longpoll.snapshot()
+    compression = app.session.http_compression.snapshot()
+    outbound = app.session.outbound_budget.snapshot()
+    inbound = app.session.inbound_mailbox.snapshot()
+    status = app.session.status_updates.snapshot()
+    websocket = app.session.websocket_traffic.snapshot()
+    admission = app.session.admission.counters.snapshot()
+    password_cache = login_manager.password_cache
+    traces = tracing.counters.snapshot()
+    login_queue = login_manager.counters.snapshot()
+    geolocation_cache = helpers.geolocation_cache
+    verification_cache = login_manager.verification_cache
+    broadcasts = app.session.presence_broadcasts.snapshot()
+    saved_per_broadcast = (
+        broadcasts['saved'] / broadcasts['broadcasts']
+        if broadcasts['broadcasts'] else 0.0
+    )
+    handoffs_per_packet = (
+        inbound['handoffs'] / inbound['items']
+        if inbound['items'] else 0.0
+    )
+    compression_ratio = (
+        compression['bytes_out'] / compression['bytes_in']
+        if compression['bytes_in'] else 0.0
+    )
+
+    return [
+        "Networking metrics",
+        f"  Admission: {admission['accepted']} accepted, {admission['blocked']} blocked, {admission['connection_limit']} over connection limit, {admission['rate_limited']} rate limited, {admission['overloaded']} shed",
+        f"  Packet cache: {app.session.packet_cache.hit_rate:.2%} hit rate ({app.session.packet_cache.total} total)",
+        f"  TCP writes: {tcp_writes} packets in {tcp_flushes} flushes",
+        f"  IRC writes: {irc_writes} lines in {irc_flushes} flushes (peak queue depth: {irc_peak_depth})",
+        f"  Websocket: {websocket['packets']} packets in {websocket['frames']} frames ({websocket['bytes_in']} bytes, {websocket['bytes_out']} after compression)",
+        f"  HTTP: {http_requests} requests / min from {http_clients} clients",
+        f"  HTTP long-polling: {longpoll['active']} held, {longpoll['woken']} woken, {longpoll['timeouts']} timed out ({longpoll['held']} total)",
+        f"  HTTP compression: {compression['compressed']} compressed, {compression['skipped']} skipped ({compression_ratio:.2%} avg. ratio)",
+        f"  Outbound budget: {outbound['dropped']} dropped, {outbound['coalesced']} coalesced, {outbound['disconnects']} disconnects",
+        f"  Inbound mailboxes: {inbound['items']} items in {inbound['handoffs']} thread handoffs ({handoffs_per_packet:.2f} per item)",
+        f"  Presence bundle: {len(app.session.players.presence)} players in {len(app.session.players.presence.chunks)} chunks",
+        f"  Password cache: {password_cache.stats.hit_rate:.2%} hit rate ({len(password_cache)} entries)",
+        f"  Geolocation cache: {geolocation_cache.stats.hit_rate:.2%} hit rate ({len(geolocation_cache)} addresses), utc offsets: {helpers.utc_offset_stats.hit_rate:.2%} hit rate",
+        f"  Client verification cache: {verification_cache.stats.hit_rate:.2%} hit rate ({len(verification_cache)} executables)",
+        f"  Presence broadcasts: {broadcasts['broadcasts']} broadcasts to {broadcasts['recipients']} clients, {broadcasts['saved']} packets saved by presence filters ({saved_per_broadcast:.2f} per broadcast)",
+        f"  Status updates: {status['distributed']} distributed out of {status['received']} received",
+        f"  Logins: {login_manager.active}/{int(login_manager.limit)} active, {len(login_manager.waiting)} waiting, {login_queue['queued']} queued, {login_queue['expired']} expired, {login_queue['abandoned']} abandoned, {login_queue['decreases']} limit decreases",
+        f"  Packet latency: {app.session.packet_latency.value * 1000:.2f}ms",
+        f"  Tracing: {'enabled' if tracing.enabled else 'disabled'}, {traces['traces']} traces, {traces['sampled']} sampled, {traces['slow']} slow spans, {traces['exported']} spans exported, {traces['dropped']} dropped",
+    ]
+
 @system_commands.register(['maintenance', 'panic'], "admin")
 def maintenance_mode(ctx: Context) -> List[str]:
     """<on/off>"""
@@ -201,25 +270,47 @@ def reload_filter(ctx: Context) -> List[str]:
 
 @system_commands.register(['block', 'blockip'], "admin", hidden=True)
 def block_connection(ctx: Context) -> List[str]:
-    """<ip> - Block an IP address from connecting to Bancho"""
+    """<ip/range> - Block an IP address or CIDR range from connecting to Bancho"""
     if len(ctx.args) != 1:
-        return [f'Invalid syntax: !{system_commands.trigger} {ctx.trigger} <ip>']
+        return [f'Invalid syntax: !{system_commands.trigger} {ctx.trigger} <ip/range>']
+
+    try:
+        network = app.session.blocked_connections.add(ctx.args[0])
+    except ValueError:
+        return [f'Invalid IP address or range: {ctx.args[0]}']
 
-    ip = ctx.args[0]
-    app.session.blocked_connections.add(hash(ip))
+    app.session.redis.sadd(BLOCKLIST_REDIS_KEY, str(network))
+    app.session.events.submit('blocklist_reload')
 
-    return [f'Blocked IP address: {ip}']
+    return [f'Blocked IP range: {network}']
 
 @system_commands.register(['unblock', 'unblockip'], "admin", hidden=True)
 def unblock_connection(ctx: Context) -> List[str]:
-    """<ip> - Unblock an IP address from connecting to Bancho"""
+    """<ip/range> - Unblock an IP address or CIDR range from connecting to Bancho"""
     if len(ctx.args) != 1:
-        return [f'Invalid syntax: !{system_commands.trigger} {ctx.trigger} <ip>']
+        return [f'Invalid syntax: !{system_commands.trigger} {ctx.trigger} <ip/range>']
 
-    ip = ctx.args[0]
-    app.session.blocked_connections.discard(hash(ip))
+    try:
+        network = app.session.blocked_connections.remove(ctx.args[0])
+    except ValueError:
+        return [f'Invalid IP address or range: {ctx.args[0]}']
+
+    app.session.redis.srem(BLOCKLIST_REDIS_KEY, str(network))
+    app.session.events.submit('blocklist_reload')
+
+    return [f'Unblocked IP range: {network}']
 
-    return [f'Unblocked IP address: {ip}']
+@system_commands.register(['reloadblocklist'], "admin", hidden=True)
+def reload_blocklist(ctx: Context) -> List[str]:
+    """- Reload blocked IP ranges from file & redis"""
+    ranges = helpers.reload_blocklist()
+    return [f'Reloaded blocklist with {ranges} ranges.']
+
+@system_commands.register(['reloadreleases'], "admin", hidden=True)
+def reload_releases(ctx: Context) -> List[str]:
+    """- Clear the client verification cache on all servers"""
+    app.session.events.submit('releases_changed')
+    return ['Client verification cache will be cleared.']
 
 @system_commands.register(['spectateuser', 'spectate'], "admin")
 def spectate_user(ctx: Context):
@@ -298,12 +389,7 @@ def mp_help(ctx: Context):
     response = []
 
     for command in mp_commands.commands:
-        has_permission = permissions.has_permission(
-            permission=command.permission,
-            user_id=ctx.player.id
-        )
-
-        if not has_permission:
+        if not ctx.player.has_permission(command.permission):
             continue
 
         if not command.doc:
@@ -319,7 +405,7 @@ def create_persistant_match(ctx: Context):
     if len(ctx.args) < 1:
         return [f'Invalid syntax: !{mp_commands.trigger} {ctx.trigger} <name>']
 
-    is_tournament_manager = permissions.has_permission("bancho.matches.bypass_limit", user_id=ctx.player.id)
+    is_tournament_manager = ctx.player.has_permission("bancho.matches.bypass_limit")
 
     # Tournament managers should be able to freely manage matches
     if len(ctx.player.referee_matches) > 3 and not is_tournament_manager:
@@ -1183,10 +1269,7 @@ def mp_addref(ctx: Context):
     """<username> - Add a referee to this match"""
     match: Match = ctx.get_context_object('match')
 
-    can_manage_referees = permissions.has_permission(
-        "bancho.matches.force_ref",
-        user_id=ctx.player.id
-    )
+    can_manage_referees = ctx.player.has_permission("bancho.matches.force_ref")
 
     if not match:
         return ["You are not inside a match."]
@@ -1231,10 +1314,7 @@ def mp_removeref(ctx: Context):
     """<username> - Remove a referee from this match"""
     match: Match = ctx.get_context_object('match')
 
-    can_manage_referees = permissions.has_permission(
-        "bancho.matches.force_ref",
-        user_id=ctx.player.id
-    )
+    can_manage_referees = ctx.player.has_permission("bancho.matches.force_ref")
 
     if not match:
         return ["You are not inside a match."]
@@ -1292,12 +1372,7 @@ def help(ctx: Context) -> List | None:
     # Standard commands
     response.append('Standard Commands:')
     for command in commands:
-        has_permission = permissions.has_permission(
-            permission=command.permission,
-            user_id=ctx.player.id
-        )
-
-        if not has_permission:
+        if not ctx.player.has_permission(command.permission):
             continue
 
         response.append(
@@ -1317,12 +1392,7 @@ def help(ctx: Context) -> List | None:
             response.append(f'{set.doc} (!{set.trigger}):')
 
             for command in set.commands:
-                has_permission = permissions.has_permission(
-                    permission=command.permission,
-                    user_id=ctx.player.id
-                )
-
-                if not has_permission:
+                if not ctx.player.has_permission(command.permission):
                     continue
 
                 if not command.doc:
@@ -1564,7 +1634,7 @@ def set_preferred_ranking(ctx: Context):
     ctx.player.enqueue_stats(ctx.player)
 
     if ctx.player.io.requires_status_updates:
-        ctx.player.enqueue_players(app.session.players)
+        ctx.player.enqueue_all_players()
 
     app.session.tasks.do_later(
         users.update,
@@ -0,0 +1,41 @@
+
+from app.common.config import Config as CommonConfig
+
+import os
+
+def read_bool(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ('1', 'true')
+
+class Config(CommonConfig):
+    """
+    The shared configuration of "app.common.config", extended by settings
+    which only apply to bancho. All of them are documented inside .env_example.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # Outbound budget of every connection & the policy once it is exceeded
+        self.BANCHO_OUTBOUND_MAX_BYTES = int(os.environ.get('BANCHO_OUTBOUND_MAX_BYTES', 2**22))
+        self.BANCHO_OUTBOUND_MAX_PACKETS = int(os.environ.get('BANCHO_OUTBOUND_MAX_PACKETS', 2**14))
+        self.BANCHO_OUTBOUND_POLICY = os.environ.get('BANCHO_OUTBOUND_POLICY', 'coalesce').lower()
+
+        # Long-polling & response compression of http clients
+        self.BANCHO_LONGPOLL = read_bool('BANCHO_LONGPOLL', False)
+        self.BANCHO_LONGPOLL_TIMEOUT = float(os.environ.get('BANCHO_LONGPOLL_TIMEOUT', 15))
+        self.BANCHO_HTTP_COMPRESSION_THRESHOLD = int(os.environ.get('BANCHO_HTTP_COMPRESSION_THRESHOLD', 1024))
+        self.BANCHO_HTTP_COMPRESSION_LEVEL = int(os.environ.get('BANCHO_HTTP_COMPRESSION_LEVEL', 6))
+
+        # Permessage-deflate of websocket clients
+        self.BANCHO_WS_COMPRESSION = read_bool('BANCHO_WS_COMPRESSION', False)
+        self.BANCHO_WS_COMPRESSION_MEM_LEVEL = int(os.environ.get('BANCHO_WS_COMPRESSION_MEM_LEVEL', 8))
+
+        # Size of the process pool, which checks bcrypt passwords
+        self.BANCHO_BCRYPT_WORKERS = int(os.environ.get('BANCHO_BCRYPT_WORKERS') or max(1, (os.cpu_count() or 2) // 2))
+
+        # Request tracing
+        self.BANCHO_TRACING = read_bool('BANCHO_TRACING', False)
+        self.BANCHO_TRACING_SAMPLE_RATE = float(os.environ.get('BANCHO_TRACING_SAMPLE_RATE', 0.01))
+        self.BANCHO_TRACING_SLOW_MS = float(os.environ.get('BANCHO_TRACING_SLOW_MS', 250))
+
+config_instance = Config()
@@ -6,6 +6,8 @@ from app.common.database.objects import DBActivity
 from app.common.constants import UserActivity
 from app.clients.base import Client
 from app.common import officer
+from app import helpers
+from app.tasks.logins import manager as login_manager
 from datetime import datetime
 from typing import Optional
 from chio import Mode
@@ -250,6 +252,25 @@ def external_dm(
         {'read': True}
     )
 
+@app.session.events.register('password_changed')
+def password_changed(user_id: int) -> None:
+    login_manager.invalidate_password(user_id)
+
+@app.session.events.register('permissions_changed')
+def permissions_changed(user_id: int) -> None:
+    for player in app.session.players.by_id_all(user_id):
+        player.reload_permissions()
+
+@app.session.events.register('releases_changed')
+def releases_changed() -> None:
+    login_manager.verification_cache.clear()
+    app.session.logger.info('Cleared client verification cache')
+
+@app.session.events.register('blocklist_reload')
+def blocklist_reload() -> None:
+    ranges = helpers.reload_blocklist()
+    app.session.logger.info(f'Reloaded blocklist with {ranges} ranges')
+
 @app.session.events.register('shutdown')
 def shutdown() -> None:
     sys.exit(0)
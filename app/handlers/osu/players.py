@@ -1,7 +1,9 @@
 
 
 from chio import PresenceFilter, PacketType, UserStatus
+from twisted.internet import reactor
 from typing import Callable, List
+from threading import Lock
 
 from app.common.constants import UserActivity
 from app.common.database import relationships
@@ -9,6 +11,13 @@ from app.common.helpers import activity
 from app.clients.osu import OsuClient
 from app import session
 
+# Status updates of a player are coalesced within this interval,
+# because clients send bursts of them while browsing song select
+STATUS_DEBOUNCE_INTERVAL = 0.5
+
+# Guards the "status_update_pending" flag of every client
+pending_status_lock = Lock()
+
 def register(packet: PacketType) -> Callable:
     def wrapper(func) -> Callable:
         session.osu_handlers[packet] = func
@@ -46,8 +55,8 @@ def add_friend(client: OsuClient, target_id: int):
         )
 
     client.logger.info(f'{client.name} is now friends with {target.name}.')
-    client.reload(client.status.mode.value)
-    client.enqueue_packet(PacketType.BanchoFriendsList, client.friends)
+    client.add_friend(target.id)
+    client.enqueue_packet(PacketType.BanchoFriendsList, list(client.friends))
 
 @register(PacketType.OsuFriendsRemove)
 def remove_friend(client: OsuClient, target_id: int):
@@ -76,28 +85,29 @@ def remove_friend(client: OsuClient, target_id: int):
         )
 
     client.logger.info(f'{client.name} is no longer friends with {target.name}.')
-    client.reload(client.status.mode.value)
-    client.enqueue_packet(PacketType.BanchoFriendsList, client.friends)
+    client.remove_friend(target.id)
+    client.enqueue_packet(PacketType.BanchoFriendsList, list(client.friends))
 
 @register(PacketType.OsuReceiveUpdates)
 def receive_updates(client: OsuClient, filter: PresenceFilter):
     client.filter = filter
+    session.players.update_presence_filter(client)
 
     if filter.value <= 0:
         # Client set filter to "None"
         # No players will be sent
         return
 
-    # Account for client filter
-    players = (
-        session.players
-        if filter == PresenceFilter.All
-        else client.online_friends
-    )
+    if filter == PresenceFilter.All:
+        session.tasks.do_later(
+            client.enqueue_all_players,
+            priority=3
+        )
+        return
 
     session.tasks.do_later(
         client.enqueue_players,
-        players,
+        client.online_friends,
         priority=3
     )
 
@@ -111,7 +121,7 @@ def presence_request(client: OsuClient, players: List[int]):
 
 @register(PacketType.OsuPresenceRequestAll)
 def presence_request_all(client: OsuClient):
-    client.enqueue_players(session.players)
+    client.enqueue_all_players()
 
 @register(PacketType.OsuUserStatsRequest)
 def stats_request(client: OsuClient, players: List[int]):
@@ -138,12 +148,54 @@ def change_status(client: OsuClient, status: UserStatus):
     client.status.mods = status.mods
     client.status.mode = status.mode
     client.status.text = status.text
-    session.tasks.do_later(
-        on_status_change,
-        client, mode_changed
+    session.status_updates.increment('received')
+
+    if mode_changed:
+        # Mode changes need to be distributed immediately,
+        # since the client will request the new rankings
+        with pending_status_lock:
+            client.status_update_pending = False
+
+        session.tasks.do_later(
+            on_status_change,
+            client, mode_changed
+        )
+        return
+
+    with pending_status_lock:
+        if client.status_update_pending:
+            # The pending update will send the latest status
+            return
+
+        client.status_update_pending = True
+
+    # Packets are handled on worker threads, so the
+    # timer has to be scheduled from inside the reactor thread
+    reactor.callFromThread(
+        reactor.callLater,
+        STATUS_DEBOUNCE_INTERVAL,
+        session.tasks.do_later,
+        flush_status_change,
+        client
     )
 
+def flush_status_change(client: OsuClient):
+    with pending_status_lock:
+        if not client.status_update_pending:
+            # Status was already flushed by a mode change,
+            # or the client has logged out in the meantime
+            return
+
+        client.status_update_pending = False
+
+    if not client.logged_in:
+        return
+
+    on_status_change(client, mode_changed=False)
+
 def on_status_change(client: OsuClient, mode_changed: bool):
+    session.status_updates.increment('distributed')
+
     if mode_changed:
         client.update_object(client.status.mode.value)
         client.reload_rankings()
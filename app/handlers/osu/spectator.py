@@ -1,5 +1,6 @@
 
 from chio import PacketType, ReplayFrameBundle
+from app.helpers import enqueue_packet_cached
 from app.clients.osu import OsuClient
 from typing import Callable
 from app import session
@@ -115,8 +116,11 @@ def send_frames(client: OsuClient, bundle: ReplayFrameBundle):
     broadcast_bundle_backlog(None, client)
 
 def broadcast_bundle(client: OsuClient, bundle: ReplayFrameBundle):
-    for p in client.spectators.snapshot_list():
-        p.enqueue_packet(PacketType.BanchoSpectateFrames, bundle)
+    enqueue_packet_cached(
+        client.spectators.snapshot_list(),
+        PacketType.BanchoSpectateFrames,
+        bundle
+    )
 
 def broadcast_bundle_backlog(result, client: OsuClient):
     if not client.spectator_backlog_active:
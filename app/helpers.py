@@ -1,10 +1,80 @@
 
-from typing import Any, Iterable
+from app.common.helpers import location
+from app.objects.caching import LRUCache
+from app.monitoring import HitRateCounter
+from typing import Any, Iterable, Dict, Tuple
+from datetime import datetime
 from chio import PacketType
+from copy import copy
 
-def enqueue_packet_cached(clients: Iterable[Any], packet: PacketType, *args) -> None:
-    """Encode one packet per BanchoIO version and enqueue it to all clients."""
-    data_cache = {}
+import time
+import pytz
+import app
+import os
+
+# Geolocation results are cached per ip address
+GEOLOCATION_CACHE_SIZE = 2**14
+GEOLOCATION_CACHE_TTL = 60 * 60 * 24
+
+# Daylight saving time transitions happen on quarter hours,
+# so the utc offsets are valid until the next quarter hour
+UTC_OFFSET_INTERVAL = 60 * 15
+
+geolocation_cache: LRUCache[str, location.Geolocation] = LRUCache(
+    GEOLOCATION_CACHE_SIZE,
+    GEOLOCATION_CACHE_TTL
+)
+utc_offsets: Dict[str, Tuple[int, float]] = {}
+utc_offset_stats = HitRateCounter()
+
+def reload_blocklist() -> int:
+    """Load blocked ip ranges from the data folder & redis"""
+    return app.session.blocked_connections.reload(
+        os.path.join(app.session.config.DATA_PATH, 'blocklist.txt'),
+        app.session.redis
+    )
+
+def fetch_geolocation(address: str) -> location.Geolocation:
+    """Fetch the geolocation of an ip address, using the geolocation cache"""
+    if (cached := geolocation_cache.get(address)) is not None:
+        # Clients may modify their location, e.g. for local ips
+        return copy(cached)
+
+    result = location.fetch_geolocation(address)
+    geolocation_cache.set(address, copy(result))
+    return result
+
+def utc_offset(timezone: str) -> int:
+    """Get the current utc offset of a timezone in hours"""
+    now = time.time()
+    cached = utc_offsets.get(timezone)
+
+    if cached is not None and cached[1] > now:
+        utc_offset_stats.record(hits=1)
+        return cached[0]
+
+    offset = int(
+        datetime.now(pytz.timezone(timezone)).utcoffset().total_seconds() / 60 / 60
+    )
+    expires_at = (now // UTC_OFFSET_INTERVAL + 1) * UTC_OFFSET_INTERVAL
+    utc_offsets[timezone] = (offset, expires_at)
+    utc_offset_stats.record(misses=1)
+    return offset
+
+def enqueue_packet_cached(
+    clients: Iterable[Any],
+    packet: PacketType,
+    *args,
+    player: Any = None
+) -> None:
+    """
+    Encode one packet per BanchoIO version and enqueue it to all clients.
+    If a player is given, the packet will additionally be encoded once per
+    ranking variant, since their stats depend on the recipient's preference.
+    """
+    data_cache: Dict[Tuple[int, str | None], bytes] = {}
+    user_id = player.id if player is not None else None
+    hits = 0
 
     for client in clients:
         enqueue = getattr(client, "enqueue", None)
@@ -13,10 +83,23 @@ def enqueue_packet_cached(clients: Iterable[Any], packet: PacketType, *args) ->
             # We can't enqueue to this client
             continue
 
-        data = data_cache.get(client.io.version)
+        ranking = (
+            client.preferred_ranking
+            if player is not None else None
+        )
+        cache_key = (client.io.version, ranking)
+        data = data_cache.get(cache_key)
 
         if data is None:
+            if player is not None:
+                player.apply_ranking(ranking)
+
             data = client.io.write_packet_to_bytes(packet, *args)
-            data_cache[client.io.version] = data
+            data_cache[cache_key] = data
+        else:
+            hits += 1
+
+        client.logger.debug('<- "%s": %r', packet.name, args)
+        enqueue(data, packet, user_id)
 
-        enqueue(data)
+    app.session.packet_cache.record(hits, len(data_cache))
@@ -60,6 +60,11 @@ class RateLimiter:
             self.allowance -= 1.0
             return True
 
+    def refund(self) -> None:
+        """Give back a token, that was consumed by a request which got rejected elsewhere"""
+        with self.lock:
+            self.allowance = min(self.limit, self.allowance + 1.0)
+
 class RequestCounter:
     """Class to count requests made over a certain time period."""
 
@@ -91,3 +96,91 @@ class RequestCounter:
         cutoff = now - self.window
         while self.requests and self.requests[0][0] <= cutoff:
             self.requests.popleft()
+
+class MovingAverage:
+    """Class to track an exponentially weighted average, e.g. for latencies."""
+
+    def __init__(self, alpha: float = 0.1, half_life: float | None = None) -> None:
+        self.lock = threading.Lock()
+        self.alpha = alpha
+        self.half_life = half_life
+        self.last_update = time.monotonic()
+        self.average = 0.0
+        self.samples = 0
+
+    @property
+    def value(self) -> float:
+        if not self.half_life:
+            return self.average
+
+        # Decay towards zero while no samples arrive, so
+        # that a past spike doesn't stay around forever
+        elapsed = time.monotonic() - self.last_update
+        return self.average * 0.5 ** (elapsed / self.half_life)
+
+    def record(self, sample: float) -> None:
+        with self.lock:
+            value = self.value
+            self.average = (
+                sample if self.samples == 0 else
+                value + self.alpha * (sample - value)
+            )
+            self.last_update = time.monotonic()
+            self.samples += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.last_update = time.monotonic()
+            self.average = 0.0
+            self.samples = 0
+
+class HitRateCounter:
+    """Class to track cache hits & misses, e.g. for encoded packets."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def total(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.total
+        return (self.hits / total) if total > 0 else 0.0
+
+    def record(self, hits: int = 0, misses: int = 0) -> None:
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def reset(self) -> None:
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+class Counters:
+    """Class to keep track of a set of named counters, e.g. for held requests."""
+
+    def __init__(self, *names: str) -> None:
+        self.values = dict.fromkeys(names, 0)
+        self.lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> int:
+        return self.values.get(name, 0)
+
+    def __repr__(self) -> str:
+        return f'<Counters {self.snapshot()}>'
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def decrement(self, name: str, amount: int = 1) -> None:
+        self.increment(name, -amount)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.values)
@@ -0,0 +1,129 @@
+
+from ipaddress import ip_address, ip_network, IPv4Network, IPv6Network
+from typing import Dict, Iterable, List, Set, Tuple
+from collections import defaultdict
+from threading import Lock
+from redis import Redis
+
+import logging
+import os
+
+# Redis set, which keeps blocked ranges across restarts
+BLOCKLIST_REDIS_KEY = 'bancho:blocklist'
+
+IPNetwork = IPv4Network | IPv6Network
+
+# Blocked network addresses of every prefix length, stored as (netmask, addresses)
+Tables = Dict[int, List[Tuple[int, frozenset]]]
+
+class Blocklist:
+    """
+    A blocklist for ip addresses and CIDR ranges. Ranges are stored as one set of
+    network addresses per prefix length, so that a lookup masks the address once
+    for every prefix length in use, which is at most one check per bit of the address.
+    Changes build new tables, which replace the old ones at once.
+    """
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger('blocklist')
+        self.networks: Set[IPNetwork] = set()
+        self.tables: Tables = {4: [], 6: []}
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.networks)
+
+    def __repr__(self) -> str:
+        return f'<Blocklist ({len(self.networks)} ranges)>'
+
+    def __contains__(self, address: str) -> bool:
+        try:
+            ip = ip_address(address)
+        except ValueError:
+            return False
+
+        if ip.version == 6 and ip.ipv4_mapped:
+            # Check "::ffff:x.x.x.x" against ipv4 ranges
+            ip = ip.ipv4_mapped
+
+        value = int(ip)
+
+        for netmask, addresses in self.tables[ip.version]:
+            if value & netmask in addresses:
+                return True
+
+        return False
+
+    def add(self, network: str) -> IPNetwork:
+        """Block an ip address or CIDR range, e.g. "10.0.0.0/8" """
+        parsed_network = ip_network(network.strip(), strict=False)
+
+        with self.lock:
+            self.networks.add(parsed_network)
+            self.tables = self.build(self.networks)
+
+        return parsed_network
+
+    def remove(self, network: str) -> IPNetwork:
+        parsed_network = ip_network(network.strip(), strict=False)
+
+        with self.lock:
+            self.networks.discard(parsed_network)
+            self.tables = self.build(self.networks)
+
+        return parsed_network
+
+    def load(self, networks: Iterable[str]) -> int:
+        """Replace all blocked ranges, e.g. from a file or redis"""
+        parsed_networks = set()
+
+        for network in networks:
+            network = network.split('#', 1)[0].strip()
+
+            if not network:
+                continue
+
+            try:
+                parsed_networks.add(ip_network(network, strict=False))
+            except ValueError:
+                self.logger.warning(f'Invalid blocklist entry: "{network}"')
+
+        tables = self.build(parsed_networks)
+
+        with self.lock:
+            self.networks = parsed_networks
+            self.tables = tables
+
+        return len(parsed_networks)
+
+    def reload(self, path: str | None = None, redis: Redis | None = None) -> int:
+        """Reload all ranges from a file and/or redis, with one range per line/member"""
+        entries: List[str] = []
+
+        if path and os.path.isfile(path):
+            with open(path, 'r') as f:
+                entries.extend(f.read().splitlines())
+
+        if redis is not None:
+            entries.extend(
+                entry.decode() for entry in
+                redis.smembers(BLOCKLIST_REDIS_KEY)
+            )
+
+        return self.load(entries)
+
+    def build(self, networks: Iterable[IPNetwork]) -> Tables:
+        addresses: Dict[Tuple[int, int, int], Set[int]] = defaultdict(set)
+
+        for network in networks:
+            key = (network.version, network.prefixlen, network.max_prefixlen)
+            addresses[key].add(int(network.network_address))
+
+        tables: Tables = {4: [], 6: []}
+
+        # Broader ranges are checked first
+        for (version, prefixlen, max_prefixlen), values in sorted(addresses.items()):
+            netmask = ((1 << prefixlen) - 1) << (max_prefixlen - prefixlen)
+            tables[version].append((netmask, frozenset(values)))
+
+        return tables
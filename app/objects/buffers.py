@@ -0,0 +1,349 @@
+
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+from twisted.internet import reactor
+from typing import Callable, Iterable, List, Tuple, Any
+from collections import deque
+from threading import Lock
+from app.config import config_instance as config
+from chio import PacketType
+from enum import Enum
+
+import app
+
+class OverflowPolicy(Enum):
+    Drop = 'drop'
+    Coalesce = 'coalesce'
+    Disconnect = 'disconnect'
+
+# Outbound budget for every connection, which is used
+# when a client is not able to keep up with our data
+OUTBOUND_MAX_BYTES = config.BANCHO_OUTBOUND_MAX_BYTES
+OUTBOUND_MAX_PACKETS = config.BANCHO_OUTBOUND_MAX_PACKETS
+OUTBOUND_POLICY = OverflowPolicy(config.BANCHO_OUTBOUND_POLICY)
+
+# Once the budget is exceeded, the queue is trimmed down to this fraction of it
+OUTBOUND_TRIM_TARGET = 0.75
+
+# Packets that can be dropped, when a client is too slow
+DROPPABLE_PACKETS = frozenset({
+    PacketType.BanchoSpectateFrames,
+    PacketType.BanchoUserStats,
+    PacketType.BanchoUserPresence,
+    PacketType.BanchoUserPresenceSingle
+})
+
+# Packets that only need to be sent once per user, i.e. the latest one
+COALESCABLE_PACKETS = frozenset({
+    PacketType.BanchoUserStats,
+    PacketType.BanchoUserPresence,
+    PacketType.BanchoUserPresenceSingle
+})
+
+# (data, packet, coalescing key)
+OutboundEntry = Tuple[bytes, PacketType | None, Any]
+
+def packet_key(packet: PacketType, args: Iterable[Any]) -> int | None:
+    """Resolve the user id of a stats/presence packet, which is used for coalescing"""
+    if packet not in COALESCABLE_PACKETS or not args:
+        return None
+
+    return getattr(args[0], 'id', None)
+
+class OutboundQueue:
+    """
+    A thread-safe queue for outgoing packets, with a budget in bytes and packets.
+    When the budget is exceeded, the overflow policy decides which packets to drop,
+    or if the client should be disconnected, using the `on_overflow` callback.
+    """
+
+    __slots__ = (
+        'lock', 'entries', 'size', 'max_bytes', 'max_packets',
+        'policy', 'on_overflow', 'overflowed'
+    )
+
+    def __init__(
+        self,
+        on_overflow: Callable[[], None] | None = None,
+        max_bytes: int = OUTBOUND_MAX_BYTES,
+        max_packets: int = OUTBOUND_MAX_PACKETS,
+        policy: OverflowPolicy = OUTBOUND_POLICY
+    ) -> None:
+        self.entries: deque[OutboundEntry] = deque()
+        self.on_overflow = on_overflow
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.overflowed = False
+        self.policy = policy
+        self.lock = Lock()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def exceeds_budget(self) -> bool:
+        return (
+            self.size > self.max_bytes or
+            len(self.entries) > self.max_packets
+        )
+
+    def empty(self) -> bool:
+        return not self.entries
+
+    def put(self, data: bytes, packet: PacketType | None = None, key: Any = None) -> bool:
+        with self.lock:
+            if self.overflowed:
+                # Client is being disconnected
+                return False
+
+            self.entries.append((data, packet, key))
+            self.size += len(data)
+
+            if not self.exceeds_budget:
+                return True
+
+            self.overflowed = not self.enforce_budget()
+
+            if self.overflowed:
+                # The backlog won't be sent to a client, that is being disconnected
+                self.entries.clear()
+                self.size = 0
+
+        if self.overflowed:
+            app.session.outbound_budget.increment('disconnects')
+
+            if self.on_overflow:
+                self.on_overflow()
+
+        return not self.overflowed
+
+    def pop(self, max_size: int = -1) -> List[bytes]:
+        """Remove & return queued data, up to `max_size` bytes if specified"""
+        with self.lock:
+            if max_size < 0:
+                chunks = [data for data, _, _ in self.entries]
+                self.entries.clear()
+                self.size = 0
+                return chunks
+
+            chunks: List[bytes] = []
+            total = 0
+
+            while self.entries and total < max_size:
+                data, _, _ = self.entries.popleft()
+                chunks.append(data)
+                total += len(data)
+
+            self.size -= total
+            return chunks
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def enforce_budget(self) -> bool:
+        """Apply the overflow policy & return whether the queue is within its budget again"""
+        if self.policy == OverflowPolicy.Disconnect:
+            return False
+
+        self.trim()
+        return not self.exceeds_budget
+
+    def trim(self) -> None:
+        """
+        Shrink the queue down to `OUTBOUND_TRIM_TARGET` of its budget, so that the
+        queue is only rebuilt once in a while, instead of on every put of a slow client.
+        Superseded stats & presence packets are removed first, if coalescing is enabled,
+        followed by the oldest droppable packets.
+        """
+        superseded = set()
+        superseded_bytes = 0
+
+        if self.policy == OverflowPolicy.Coalesce:
+            seen = set()
+            index = len(self.entries)
+
+            for data, packet, key in reversed(self.entries):
+                index -= 1
+
+                if packet not in COALESCABLE_PACKETS or key is None:
+                    continue
+
+                if (packet, key) in seen:
+                    superseded.add(index)
+                    superseded_bytes += len(data)
+                    continue
+
+                seen.add((packet, key))
+
+        excess_bytes = (
+            self.size - superseded_bytes -
+            int(self.max_bytes * OUTBOUND_TRIM_TARGET)
+        )
+        excess_packets = (
+            len(self.entries) - len(superseded) -
+            int(self.max_packets * OUTBOUND_TRIM_TARGET)
+        )
+
+        entries = deque()
+        dropped = 0
+
+        for index, entry in enumerate(self.entries):
+            data, packet, _ = entry
+
+            if index in superseded:
+                self.size -= len(data)
+                continue
+
+            if packet in DROPPABLE_PACKETS and (excess_bytes > 0 or excess_packets > 0):
+                self.size -= len(data)
+                excess_bytes -= len(data)
+                excess_packets -= 1
+                dropped += 1
+                continue
+
+            entries.append(entry)
+
+        self.entries = entries
+
+        if superseded:
+            app.session.outbound_budget.increment('coalesced', len(superseded))
+
+        if dropped:
+            app.session.outbound_budget.increment('dropped', dropped)
+
+class FlushQueue:
+    """
+    Write buffers, that are waiting for their flush on the reactor thread.
+    Buffers written to by the same broadcast, e.g. a channel message, share a
+    single callFromThread call, instead of waking up the reactor once per buffer.
+    """
+
+    __slots__ = ('buffers', 'scheduled', 'lock')
+
+    def __init__(self) -> None:
+        self.buffers: List["WriteBuffer"] = []
+        self.scheduled = False
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.buffers)
+
+    def add(self, buffer: "WriteBuffer") -> None:
+        with self.lock:
+            self.buffers.append(buffer)
+
+            if self.scheduled:
+                # The next flush will pick up this buffer
+                return
+
+            self.scheduled = True
+
+        reactor.callFromThread(self.flush)
+
+    def flush(self) -> None:
+        """Flush all waiting buffers. Must be run on the reactor thread."""
+        with self.lock:
+            buffers, self.buffers = self.buffers, []
+            self.scheduled = False
+
+        for buffer in buffers:
+            try:
+                buffer.flush()
+            except Exception as e:
+                app.session.logger.error(f'Failed to flush outbound buffer: {e}', exc_info=e)
+
+pending_flushes = FlushQueue()
+
+@implementer(IPushProducer)
+class WriteBuffer(OutboundQueue):
+    """
+    An outbound queue, which can be written to from any thread.
+    All writes will be collected and flushed once per reactor iteration, through
+    the shared flush queue, instead of writing every packet separately.
+    It acts as a producer for the transport, so that data is kept inside this buffer,
+    where the budget applies, while the transport is unable to keep up.
+    """
+
+    __slots__ = (
+        'scheduled', 'paused', 'callback', 'peak_depth',
+        'total_bytes', 'total_writes', 'total_flushes'
+    )
+
+    def __init__(
+        self,
+        callback: Callable[[List[bytes]], None],
+        on_overflow: Callable[[], None] | None = None,
+        max_bytes: int = OUTBOUND_MAX_BYTES,
+        max_packets: int = OUTBOUND_MAX_PACKETS,
+        policy: OverflowPolicy = OUTBOUND_POLICY
+    ) -> None:
+        super().__init__(on_overflow, max_bytes, max_packets, policy)
+        self.callback = callback
+        self.scheduled = False
+        self.paused = False
+
+        # Statistics for this buffer
+        self.total_bytes = 0
+        self.total_writes = 0
+        self.total_flushes = 0
+        self.peak_depth = 0
+
+    def __repr__(self) -> str:
+        return f'<WriteBuffer ({len(self.entries)} chunks, {self.size} bytes)>'
+
+    @property
+    def writes_per_flush(self) -> float:
+        return (
+            self.total_writes / self.total_flushes
+            if self.total_flushes > 0 else 0.0
+        )
+
+    def write(self, data: bytes, packet: PacketType | None = None, key: Any = None) -> None:
+        if not self.put(data, packet, key):
+            return
+
+        with self.lock:
+            self.total_writes += 1
+            self.peak_depth = max(self.peak_depth, len(self.entries))
+
+            if self.scheduled or self.paused:
+                # The next flush will pick up this data
+                return
+
+            self.scheduled = True
+
+        pending_flushes.add(self)
+
+    def flush(self) -> None:
+        """Pass all buffered data to the callback. Must be run on the reactor thread."""
+        with self.lock:
+            self.scheduled = False
+
+            if self.paused:
+                return
+
+        if not (chunks := self.pop()):
+            return
+
+        self.total_bytes += sum(len(chunk) for chunk in chunks)
+        self.total_flushes += 1
+        self.callback(chunks)
+
+    def pauseProducing(self) -> None:
+        self.paused = True
+
+    def resumeProducing(self) -> None:
+        self.paused = False
+        self.flush()
+
+    def stopProducing(self) -> None:
+        self.clear()
+
+    def abort(self, transport: Any) -> None:
+        """Drop all buffered data & abort the connection. Must be run on the reactor thread."""
+        self.clear()
+        transport.unregisterProducer()
+        transport.abortConnection()
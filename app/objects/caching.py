@@ -0,0 +1,89 @@
+
+from typing import Callable, Generic, Hashable, Tuple, TypeVar, Any
+from collections import OrderedDict
+from threading import Lock
+
+from app.monitoring import HitRateCounter
+
+import time
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+# Sentinel for entries that are not inside the cache
+missing = object()
+
+class LRUCache(Generic[K, V]):
+    """A thread-safe, size-bounded LRU cache with an optional time-to-live per entry"""
+
+    __slots__ = ('entries', 'maxsize', 'ttl', 'lock', 'stats')
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None) -> None:
+        self.entries: OrderedDict[K, Tuple[V, float]] = OrderedDict()
+        self.stats = HitRateCounter()
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self.ttl = ttl
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key, missing, record=False) is not missing
+
+    def __repr__(self) -> str:
+        return f'<LRUCache ({len(self.entries)}/{self.maxsize}, ttl={self.ttl})>'
+
+    def get(self, key: K, default: Any = None, record: bool = True) -> V | Any:
+        with self.lock:
+            if (entry := self.entries.get(key)) is None:
+                self.record(record, misses=1)
+                return default
+
+            value, expires_at = entry
+
+            if expires_at and expires_at <= time.monotonic():
+                # Entry has expired
+                del self.entries[key]
+                self.record(record, misses=1)
+                return default
+
+            self.entries.move_to_end(key)
+            self.record(record, hits=1)
+            return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key: K, default: Any = None) -> V | Any:
+        with self.lock:
+            if (entry := self.entries.pop(key, None)) is None:
+                return default
+
+            return entry[0]
+
+    def remove_where(self, predicate: Callable[[K], bool]) -> int:
+        """Remove all entries, whose key matches the predicate"""
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+
+            for key in keys:
+                del self.entries[key]
+
+            return len(keys)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def record(self, enabled: bool, hits: int = 0, misses: int = 0) -> None:
+        if enabled:
+            self.stats.record(hits, misses)
@@ -1,6 +1,6 @@
 
-from typing import TYPE_CHECKING, List, Set, Iterator, Iterable
-from chio import Message, Channel as bChannel, Permissions
+from typing import TYPE_CHECKING, List, Set, Dict, Tuple, Iterator, Iterable
+from chio import Message, Channel as bChannel, Permissions, PacketType
 from code import InteractiveConsole
 
 if TYPE_CHECKING:
@@ -10,9 +10,10 @@ if TYPE_CHECKING:
 
 from app.common.config import config_instance as config
 from app.common.database.repositories import messages
+from app.helpers import enqueue_packet_cached
 from app.objects.locks import LockedSet
 from app.common.webhooks import Webhook
-from app.clients.irc import IrcClient
+from app.clients.irc import IrcClient, LineCache
 from app.common import officer
 
 import threading
@@ -152,8 +153,8 @@ class Channel:
         if "\n" in message.content:
             return self.handle_multiline_broadcast(message, users)
 
-        for user in users:
-            user.enqueue_message_object(message)
+        osu_users, irc_users = self.partition_users(users)
+        self.broadcast_message_object(message, osu_users, irc_users)
 
     def handle_multiline_broadcast(self, message: Message, users: List["Client"]) -> None:
         message_objects = [
@@ -165,10 +166,39 @@ class Channel:
             )
             for line in message.content.splitlines()
         ]
+        osu_users, irc_users = self.partition_users(users)
+
+        for object in message_objects:
+            self.broadcast_message_object(object, osu_users, irc_users)
+
+    def broadcast_message_object(
+        self,
+        message: Message,
+        osu_users: List["OsuClient"],
+        irc_users: List["Client"]
+    ) -> None:
+        if message.content:
+            # Encode the message once per client version
+            enqueue_packet_cached(osu_users, PacketType.BanchoMessage, message)
+
+        # Format the irc lines once per variant
+        lines: LineCache = {}
+
+        for user in irc_users:
+            user.enqueue_message_object(message, lines)
+
+    def partition_users(self, users: Iterable["Client"]) -> Tuple[List["OsuClient"], List["Client"]]:
+        """Split users into osu! clients, that accept pre-encoded packets, and irc clients"""
+        osu_users, irc_users = [], []
 
         for user in users:
-            for object in message_objects:
-                user.enqueue_message_object(object)
+            if user.is_irc:
+                irc_users.append(user)
+                continue
+
+            osu_users.append(user)
+
+        return osu_users, irc_users
 
     def broadcast_message_to_webhook(self, message: Message) -> None:
         if not self.webhook_enabled:
@@ -563,10 +593,16 @@ class MultiplayerChannel(Channel):
 
     def broadcast_message(self, message: Message, users: Iterable["Client"]) -> None:
         self.logger.info(f'[{message.sender}]: {message.content}')
+        targets: Dict[str, List["Client"]] = {}
 
+        # Referee players & regular players get different channel names
         for user in users:
-            message.target = self.resolve_name(user)
-            user.enqueue_message_object(message)
+            targets.setdefault(self.resolve_name(user), []).append(user)
+
+        for target, target_users in targets.items():
+            message.target = target
+            osu_users, irc_users = self.partition_users(target_users)
+            self.broadcast_message_object(message, osu_users, irc_users)
 
 class PythonInterpreterChannel(Channel):
     def __init__(self):
@@ -12,12 +12,18 @@ from typing import (
 )
 
 from app.objects.locks import LockedDict, LockedSet
+from app.objects.relationships import FriendIndex
+from app.objects.presence import PresenceBundle
 from app.protocols.osu.http import HttpOsuClient
+from app.helpers import enqueue_packet_cached
 from app.common.cache import activity
 from app.clients.base import Client
 from app.clients.osu import OsuClient
 from app.clients.irc import IrcClient
-from chio import UserQuit
+from chio import UserQuit, PacketType, PresenceFilter
+from threading import Lock
+
+import app
 
 class Players(MutableMapping[int | str, Client]):
     def __init__(self) -> None:
@@ -39,6 +45,19 @@ class Players(MutableMapping[int | str, Client]):
         self.irc_name_mapping: LockedDict[str, IrcClient] = LockedDict()
         self.irc_safe_name_mapping: LockedDict[str, IrcClient] = LockedDict()
 
+        # Visible players, with pre-encoded presence bundles
+        self.presence = PresenceBundle()
+
+        # Online players by the friends that have added them
+        self.friend_index = FriendIndex()
+
+        # osu! clients that want updates of every player, see "presence_recipients"
+        self.osu_filter_all: LockedDict[int, OsuClient] = LockedDict()
+
+        # Every session of a player, including tourney & irc clients
+        self.sessions: Dict[int, List[Client]] = {}
+        self.sessions_lock = Lock()
+
     @property
     def osu_clients(self) -> Iterable[OsuClient]:
         return self.osu_id_mapping.values_snapshot()
@@ -114,6 +133,8 @@ class Players(MutableMapping[int | str, Client]):
 
     def add(self, player: Client) -> None:
         """Append a player to the collection"""
+        self.add_session(player)
+
         if isinstance(player, OsuClient):
             self.add_osu(player)
         elif isinstance(player, IrcClient):
@@ -121,6 +142,10 @@ class Players(MutableMapping[int | str, Client]):
 
     def remove(self, player: Client) -> None:
         """Remove a player from the collection"""
+        player.cancel_expiry_timers()
+        self.friend_index.remove(player)
+        self.remove_session(player)
+
         if isinstance(player, OsuClient):
             self.remove_osu(player)
         elif isinstance(player, IrcClient):
@@ -131,6 +156,7 @@ class Players(MutableMapping[int | str, Client]):
         self.osu_id_mapping[player.id] = player
         self.osu_name_mapping[player.name] = player
         self.osu_safe_name_mapping[player.safe_name] = player
+        self.update_presence_filter(player)
 
         if player.protocol == 'http':
             assert isinstance(player, HttpOsuClient)
@@ -139,6 +165,8 @@ class Players(MutableMapping[int | str, Client]):
         if player.is_tourney_client:
             self.osu_tournament_clients.add(player)
 
+        self.presence.add(player)
+        self.friend_index.add(player)
         self.send_player_to_osu(player)
 
     def remove_osu(self, player: OsuClient | HttpOsuClient) -> None:
@@ -150,6 +178,7 @@ class Players(MutableMapping[int | str, Client]):
             self.remove_from_collection('osu_tournament_clients', player)
 
         self.remove_from_mapping('osu_id_mapping', player.id)
+        self.remove_from_mapping('osu_filter_all', player.id)
         self.remove_from_mapping('osu_name_mapping', player.name)
         self.remove_from_mapping('osu_safe_name_mapping', player.safe_name)
 
@@ -157,12 +186,17 @@ class Players(MutableMapping[int | str, Client]):
             assert isinstance(player, HttpOsuClient)
             self.remove_from_mapping('osu_token_mapping', player.token)
 
+        if not self.by_id(player.id):
+            self.presence.remove(player.id)
+
     def add_irc(self, player: IrcClient) -> None:
         """Append a player to the collection"""
         self.irc_clients_set.add(player)
         self.irc_id_mapping[player.id] = player
         self.irc_name_mapping[player.name] = player
         self.irc_safe_name_mapping[player.safe_name] = player
+        self.presence.add(player)
+        self.friend_index.add(player)
         self.send_player_to_osu(player)
 
     def remove_irc(self, player: IrcClient) -> None:
@@ -177,6 +211,9 @@ class Players(MutableMapping[int | str, Client]):
 
         if not other_irc_session:
             # User has logged out of all irc sessions
+            if not self.by_id(player.id):
+                self.presence.remove(player.id)
+
             return
 
         # Set new "primary" irc session
@@ -184,6 +221,68 @@ class Players(MutableMapping[int | str, Client]):
         self.irc_name_mapping[player.name] = other_irc_session
         self.irc_safe_name_mapping[player.safe_name] = other_irc_session
 
+    def add_session(self, player: Client) -> None:
+        with self.sessions_lock:
+            sessions = self.sessions.setdefault(player.id, [])
+
+            if not any(session is player for session in sessions):
+                sessions.append(player)
+
+    def remove_session(self, player: Client) -> None:
+        with self.sessions_lock:
+            if (sessions := self.sessions.get(player.id)) is None:
+                return
+
+            sessions[:] = [session for session in sessions if session is not player]
+
+            if not sessions:
+                del self.sessions[player.id]
+
+    def update_visibility(self, player: Client) -> None:
+        """Add or remove a player from the presence bundle, after they were (un)hidden"""
+        if player.hidden:
+            self.presence.remove(player.id)
+            return
+
+        if self.by_id(player.id):
+            self.presence.add(player)
+
+    def update_presence_filter(self, player: OsuClient) -> None:
+        """Apply a change of the player's presence filter to the broadcast index"""
+        if self.osu_id_mapping.get(player.id) is not player:
+            # Player is not the active osu! session of this user
+            return
+
+        if player.filter == PresenceFilter.All:
+            self.osu_filter_all[player.id] = player
+            return
+
+        self.remove_from_mapping('osu_filter_all', player.id)
+
+    def presence_recipients(self, player: Client) -> List[OsuClient]:
+        """Get all osu! clients, whose presence filter includes this player"""
+        recipients = self.osu_filter_all.values_snapshot()
+
+        # Clients with the "Friends" filter only want their friends
+        for user_id in self.friend_index.friended_by(player.id):
+            client = self.osu_id_mapping.get(user_id)
+
+            if client and client.filter == PresenceFilter.Friends:
+                recipients.append(client)
+
+        # Players always receive their own updates
+        own_client = self.osu_id_mapping.get(player.id)
+
+        if own_client and own_client.filter != PresenceFilter.All:
+            recipients.append(own_client)
+
+        app.session.presence_broadcasts.increment('broadcasts')
+        app.session.presence_broadcasts.increment('recipients', len(recipients))
+        app.session.presence_broadcasts.increment(
+            'saved', max(0, len(self.osu_id_mapping) - len(recipients))
+        )
+        return recipients
+
     def remove_from_mapping(self, name: str, key: Any) -> None:
         try:
             del getattr(self, name)[key]
@@ -247,6 +346,11 @@ class Players(MutableMapping[int | str, Client]):
         """Get an irc player by id"""
         return self.irc_id_mapping.get(id, None)
 
+    def by_id_all(self, id: int) -> List[Client]:
+        """Get all connected sessions of a player, e.g. osu!, tourney & irc clients"""
+        with self.sessions_lock:
+            return list(self.sessions.get(id, ()))
+
     def by_id_irc_all(self, id: int) -> List[IrcClient]:
         """Get all connected IRC clients for this user id"""
         return [p for p in self.irc_clients_set if p.id == id]
@@ -285,29 +389,52 @@ class Players(MutableMapping[int | str, Client]):
         )
 
     def send_packet(self, packet, *args) -> None:
-        for p in self.osu_clients:
-            p.enqueue_packet(packet, *args)
+        enqueue_packet_cached(self.osu_clients, packet, *args)
 
     def send_player_to_osu(self, player: Client) -> None:
-        for p in self.osu_clients:
-            p.enqueue_player(player)
+        if player.hidden:
+            return
+
+        enqueue_packet_cached(
+            self.presence_recipients(player),
+            PacketType.BanchoUserPresenceSingle,
+            player, player=player
+        )
 
     def send_player_bundle(self, players: List[Client]) -> None:
         for p in self:
             p.enqueue_players(players)
 
     def send_presence(self, player: Client) -> None:
-        for p in self.osu_clients:
-            p.enqueue_presence(player)
+        if player.hidden:
+            # Hidden players only receive their own presence
+            recipients = [p for p in self.osu_clients if p == player]
+        else:
+            recipients = self.presence_recipients(player)
+
+        enqueue_packet_cached(
+            recipients,
+            PacketType.BanchoUserPresence,
+            player, player=player
+        )
 
     def send_stats(self, player: OsuClient) -> None:
-        for p in self.osu_clients:
-            if not p.io.requires_status_updates:
-                # Client will request the stats
-                # themselves, when pressing F9
-                continue
+        if player.is_irc:
+            return
 
-            p.enqueue_stats(player)
+        # Clients that don't require status updates will
+        # request the stats themselves, when pressing F9
+        recipients = [
+            p for p in self.presence_recipients(player)
+            if p.io.requires_status_updates
+            and (not player.hidden or p == player)
+        ]
+
+        enqueue_packet_cached(
+            recipients,
+            PacketType.BanchoUserStats,
+            player, player=player
+        )
 
     def send_stats_forced(self, player: OsuClient) -> None:
         for p in self.osu_clients:
@@ -318,11 +445,16 @@ class Players(MutableMapping[int | str, Client]):
             p.apply_ranking(ranking)
 
     def send_announcement(self, message: str) -> None:
-        for p in self:
+        enqueue_packet_cached(self.osu_clients, PacketType.BanchoAnnounce, message)
+
+        for p in self.irc_clients:
             p.enqueue_announcement(message)
 
     def send_user_quit(self, quit: UserQuit) -> None:
-        for p in self:
+        if not quit.info.hidden:
+            enqueue_packet_cached(self.osu_clients, PacketType.BanchoUserQuit, quit)
+
+        for p in self.irc_clients:
             p.enqueue_user_quit(quit)
 
     def send_channel(self, channel: "Channel") -> None:
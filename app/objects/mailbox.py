@@ -0,0 +1,78 @@
+
+from typing import Callable, Generic, List, TypeVar
+from collections import deque
+from threading import Lock
+
+import time
+import app
+
+T = TypeVar('T')
+
+class Mailbox(Generic[T]):
+    """
+    A serial inbox for a single connection.
+    Items are appended from the reactor thread and drained in batches by one worker
+    at a time, so that they are processed in order and only one thread handoff is
+    needed for as many items as arrive while the worker is busy.
+    """
+
+    __slots__ = ('lock', 'items', 'handler', 'on_error', 'draining', 'scheduled_at')
+
+    def __init__(
+        self,
+        handler: Callable[[List[T]], None],
+        on_error: Callable[[Exception], None] | None = None
+    ) -> None:
+        self.items: deque[T] = deque()
+        self.on_error = on_error
+        self.handler = handler
+        self.draining = False
+        self.scheduled_at = 0.0
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self) -> str:
+        return f'<Mailbox ({len(self.items)} items, draining={self.draining})>'
+
+    def put(self, *items: T) -> None:
+        with self.lock:
+            self.items.extend(items)
+            app.session.inbound_mailbox.increment('items', len(items))
+
+            if self.draining:
+                # The active worker will pick up these items
+                return
+
+            self.draining = True
+            self.scheduled_at = time.monotonic()
+
+        app.session.inbound_mailbox.increment('handoffs')
+        app.session.tasks.defer_to_reactor_thread(self.drain)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+
+    def drain(self) -> None:
+        """Process all items until the mailbox is empty. Runs inside a worker thread."""
+        # Time spent waiting for a worker thread, which is used to detect overload
+        app.session.packet_latency.record(time.monotonic() - self.scheduled_at)
+
+        while True:
+            with self.lock:
+                if not self.items:
+                    self.draining = False
+                    return
+
+                batch = list(self.items)
+                self.items.clear()
+
+            try:
+                self.handler(batch)
+            except Exception as e:
+                self.clear()
+
+                if self.on_error:
+                    self.on_error(e)
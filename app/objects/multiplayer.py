@@ -26,6 +26,7 @@ from app.common.database.repositories import beatmaps, events, matches
 from app.common.config import config_instance as config
 from app.common.constants import GameMode, EventType
 from app.common.database import DBMatch
+from app.helpers import enqueue_packet_cached
 
 import logging
 import time
@@ -263,8 +264,7 @@ class Match:
 
     def update(self, lobby=True) -> None:
         # Enqueue to our players
-        for player in self.players:
-            player.enqueue_packet(PacketType.BanchoMatchUpdate, self)
+        enqueue_packet_cached(self.players, PacketType.BanchoMatchUpdate, self)
 
         if not lobby:
             return
@@ -276,8 +276,10 @@ class Match:
             self.password = " "
 
         # Enqueue to lobby players
-        for player in app.session.players.osu_in_lobby.snapshot_list():
-            player.enqueue_packet(PacketType.BanchoMatchUpdate, self)
+        enqueue_packet_cached(
+            app.session.players.osu_in_lobby.snapshot_list(),
+            PacketType.BanchoMatchUpdate, self
+        )
 
         # Re-apply password
         self.password = match_password
@@ -835,8 +837,7 @@ class Match:
             return
 
         # Broadcast first score frame and proceed to loop
-        for p in target_players:
-            p.enqueue_packet(PacketType.BanchoMatchScoreUpdate, scoreframe)
+        enqueue_packet_cached(target_players, PacketType.BanchoMatchScoreUpdate, scoreframe)
 
         self.last_activity = time.time()
 
@@ -849,8 +850,7 @@ class Match:
             if not scoreframe:
                 continue
 
-            for p in target_players:
-                p.enqueue_packet(PacketType.BanchoMatchScoreUpdate, scoreframe)
+            enqueue_packet_cached(target_players, PacketType.BanchoMatchScoreUpdate, scoreframe)
 
         self.logger.info('Score processor finished.')
         self.score_thread = None
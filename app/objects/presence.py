@@ -0,0 +1,89 @@
+
+from typing import Dict, List, TYPE_CHECKING
+from threading import Lock
+from chio import PacketType
+
+if TYPE_CHECKING:
+    from app.clients.base import Client
+
+class PresenceChunk:
+    """A slice of the presence bundle, with its encoded packet per client version"""
+
+    __slots__ = ('players', 'encoded')
+
+    def __init__(self) -> None:
+        self.players: Dict[int, "Client"] = {}
+        self.encoded: Dict[int, bytes] = {}
+
+class PresenceBundle:
+    """
+    An ordered set of all visible players, split into chunks of `chunk_size`.
+    Joins & quits only invalidate the chunk they touch, so that a login can
+    reuse the encoded presence bundle packets, instead of walking every client.
+    """
+
+    chunk_size = 512
+
+    def __init__(self) -> None:
+        self.chunks: List[PresenceChunk] = []
+        self.mapping: Dict[int, PresenceChunk] = {}
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.mapping)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self.mapping
+
+    def __repr__(self) -> str:
+        return f'<PresenceBundle ({len(self.mapping)} players, {len(self.chunks)} chunks)>'
+
+    def add(self, player: "Client") -> None:
+        if player.hidden:
+            return
+
+        with self.lock:
+            if player.id in self.mapping:
+                return
+
+            chunk = next(
+                (c for c in self.chunks if len(c.players) < self.chunk_size),
+                None
+            )
+
+            if chunk is None:
+                chunk = PresenceChunk()
+                self.chunks.append(chunk)
+
+            chunk.players[player.id] = player
+            chunk.encoded.clear()
+            self.mapping[player.id] = chunk
+
+    def remove(self, player_id: int) -> None:
+        with self.lock:
+            if not (chunk := self.mapping.pop(player_id, None)):
+                return
+
+            chunk.players.pop(player_id, None)
+            chunk.encoded.clear()
+
+            if not chunk.players:
+                self.chunks.remove(chunk)
+
+    def packets(self, client: "Client") -> List[bytes]:
+        """Get the encoded presence bundle packets for the client's version"""
+        version = client.io.version
+        packets = []
+
+        with self.lock:
+            for chunk in self.chunks:
+                if (data := chunk.encoded.get(version)) is None:
+                    data = client.io.write_packet_to_bytes(
+                        PacketType.BanchoUserPresenceBundle,
+                        list(chunk.players.values())
+                    )
+                    chunk.encoded[version] = data
+
+                packets.append(data)
+
+        return packets
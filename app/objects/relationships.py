@@ -0,0 +1,75 @@
+
+from typing import Counter, Dict, FrozenSet, TYPE_CHECKING
+from collections import defaultdict
+from threading import Lock
+
+if TYPE_CHECKING:
+    from app.clients.base import Client
+
+class FriendIndex:
+    """
+    A reverse index of friendships between online players, i.e. "who has friended me".
+    Every session registers its friend list, so that a player stays inside
+    the index for as long as one of their sessions is online.
+    """
+
+    def __init__(self) -> None:
+        self.followers: Dict[int, Counter[int]] = defaultdict(Counter)
+        self.sessions: Dict[int, FrozenSet[int]] = {}
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.followers)
+
+    def __repr__(self) -> str:
+        return f'<FriendIndex ({len(self.sessions)} sessions, {len(self.followers)} players)>'
+
+    def friended_by(self, user_id: int) -> FrozenSet[int]:
+        """Get the ids of all online players, that have this player as a friend"""
+        with self.lock:
+            if user_id not in self.followers:
+                return frozenset()
+
+            return frozenset(self.followers[user_id])
+
+    def add(self, player: "Client") -> None:
+        with self.lock:
+            if id(player) in self.sessions:
+                return
+
+            self.sessions[id(player)] = player.friends
+            self.link(player.id, player.friends)
+
+    def remove(self, player: "Client") -> None:
+        with self.lock:
+            if (friends := self.sessions.pop(id(player), None)) is None:
+                return
+
+            self.unlink(player.id, friends)
+
+    def update(self, player: "Client") -> None:
+        """Apply changes of the player's friend list, if the player is online"""
+        with self.lock:
+            if (previous := self.sessions.get(id(player))) is None:
+                return
+
+            self.sessions[id(player)] = player.friends
+            self.unlink(player.id, previous - player.friends)
+            self.link(player.id, player.friends - previous)
+
+    def link(self, user_id: int, friends: FrozenSet[int]) -> None:
+        for friend_id in friends:
+            self.followers[friend_id][user_id] += 1
+
+    def unlink(self, user_id: int, friends: FrozenSet[int]) -> None:
+        for friend_id in friends:
+            if (followers := self.followers.get(friend_id)) is None:
+                continue
+
+            followers[user_id] -= 1
+
+            if followers[user_id] <= 0:
+                del followers[user_id]
+
+            if not followers:
+                del self.followers[friend_id]
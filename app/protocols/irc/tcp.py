@@ -4,11 +4,13 @@ from twisted.internet.error import ConnectionDone
 from twisted.internet import reactor, threads
 from twisted.words.protocols.irc import IRC
 from twisted.python.failure import Failure
-from typing import List, Any
+from typing import List, Tuple, Any
 from chio import Message
 
 from app.common.config import config_instance as config
-from app.clients.irc import IrcClient
+from app.objects.buffers import WriteBuffer, OverflowPolicy
+from app.objects.mailbox import Mailbox
+from app.clients.irc import IrcClient, LineCache
 from app.clients import Client
 
 import logging
@@ -16,12 +18,41 @@ import app
 
 IPAddress = IPv4Address | IPv6Address
 
+# Outbound budget for irc connections, which will
+# get disconnected when they can't keep up
+OUTBOUND_MAX_LINES = 2**13
+OUTBOUND_MAX_BYTES = 2**21
+
+def format_message_line(message: Message, recipient: str) -> bytes:
+    """Format a PRIVMSG line, which can be shared across recipients"""
+    message_content = message.content
+
+    # Handle action messages (e.g. /me)
+    if message_content.startswith("\x01ACTION"):
+        message_content = (
+            f"*{message.sender} " +
+            message_content.removeprefix("\x01ACTION ").strip()
+        )
+
+    return (
+        f':{message.sender.replace(" ", "_")}!cho@{config.DOMAIN_NAME} '
+        f'PRIVMSG {recipient.replace(" ", "_")} :{message_content}\r\n'
+    ).encode()
+
 class TcpIrcProtocol(IrcClient, IRC):
     """TCP protocol for IRC connections"""
 
     def __init__(self, address: IPAddress) -> None:
         super().__init__(address.host, address.port)
         self.logger = logging.getLogger(address.host)
+        self.inbound = Mailbox(self.on_commands_received)
+        self.outbound = WriteBuffer(
+            self.write_lines,
+            on_overflow=self.on_outbound_overflow,
+            max_bytes=OUTBOUND_MAX_BYTES,
+            max_packets=OUTBOUND_MAX_LINES,
+            policy=OverflowPolicy.Disconnect
+        )
         self.protocol = 'tcp'
 
     def connectionMade(self) -> None:
@@ -33,11 +64,6 @@ class TcpIrcProtocol(IrcClient, IRC):
             self.close_connection('IRC is disabled')
             return
 
-        if hash(self.address) in app.session.blocked_connections:
-            self.logger.warning(f'Blocked connection from {self.address}')
-            self.close_connection('Blocked IP')
-            return
-
         # Ensure client is logged in after 8 seconds, else close connection
         reactor.callLater(8, self.handle_timeout_callback)
 
@@ -46,7 +72,12 @@ class TcpIrcProtocol(IrcClient, IRC):
         self.transport.setTcpNoDelay(True)
         self.transport.setTcpKeepAlive(True)
 
+        # Keep data inside our outbound buffer, while
+        # the transport is unable to send it
+        self.transport.registerProducer(self.outbound, True)
+
     def connectionLost(self, reason: Failure) -> None:
+        app.session.admission.release(self.address)
         self.logger.info(
             f'<{self.address}> -> Connection done.'
             if reason.type is ConnectionDone else
@@ -62,22 +93,42 @@ class TcpIrcProtocol(IrcClient, IRC):
             self.close_connection("Invalid data received")
 
     def handleCommand(self, command: str, prefix: str, params: List[str]) -> None:
-        deferred = app.session.tasks.defer_to_reactor_thread(
-            self.on_command_received,
-            command, prefix, params
-        )
-
-        deferred.addErrback(
-            lambda f: (
-                self.logger.error(f"Error processing command '{command}': {f.getErrorMessage()}", exc_info=f.value),
+        self.inbound.put((command, prefix, params))
+
+    def on_commands_received(self, commands: List[Tuple[str, str, List[str]]]) -> None:
+        for command, prefix, params in commands:
+            try:
+                self.on_command_received(command, prefix, params)
+            except Exception as e:
+                self.logger.error(f"Error processing command '{command}': {e}", exc_info=e)
+                self.inbound.clear()
                 self.close_connection('Request processing error')
-            )
-        )
+                return
 
     def close_connection(self, reason: Any = None) -> None:
         reactor.callFromThread(self.transport.loseConnection)
         super().close_connection(reason)
 
+    def on_outbound_overflow(self) -> None:
+        # Abort instead of flushing the backlog to a client, that can't keep up
+        reactor.callFromThread(self.outbound.abort, self.transport)
+        super().close_connection('Outbound budget exceeded')
+
+    def sendLine(self, line: str | bytes) -> None:
+        # Lines can be sent from any thread, so we buffer them
+        # and let the reactor write them all at once
+        if isinstance(line, str):
+            line = line.encode(self.encoding or "utf-8")
+
+        self.outbound.write(line + b"\r\n")
+
+    def write_lines(self, lines: List[bytes]) -> None:
+        try:
+            self.transport.writeSequence(lines)
+        except Exception as e:
+            self.logger.critical(f'Failed to write to transport layer: {e}', exc_info=e)
+            self.close_connection('Transport write error')
+
     def enqueue_line(self, line: str) -> None:
         self.logger.debug(f"-> {line}")
         self.sendLine(line)
@@ -117,27 +168,22 @@ class TcpIrcProtocol(IrcClient, IRC):
             )
         )
 
-    def enqueue_message_object(self, message: Message) -> None:
-        super().enqueue_message_object(message)
-        message_content = message.content
-
-        # Handle action messages (e.g. /me)
-        if message_content.startswith("\x01ACTION"):
-            message_content = (
-                f"*{message.sender} " +
-                message_content.removeprefix("\x01ACTION ").strip()
-            )
+    def enqueue_message_object(self, message: Message, lines: LineCache | None = None) -> None:
+        super().enqueue_message_object(message, lines)
 
         # Server -> Client privmsg target must be the recipient nick (this client)
         # for private messages, or the channel name for channel messages
         is_channel = message.target.startswith("#")
         recipient = message.target if is_channel else self.local_prefix
+        line_key = (recipient, message.sender)
 
-        self.sendMessage(
-            "PRIVMSG",
-            recipient.replace(" ", "_"),
-            ":" + message_content,
-            prefix=(
-                f'{message.sender.replace(" ", "_")}!cho@{config.DOMAIN_NAME}'
-            )
-        )
+        if lines is not None and (line := lines.get(line_key)):
+            # Line was already formatted for another recipient
+            self.outbound.write(line)
+            return
+
+        line = format_message_line(message, recipient)
+        self.outbound.write(line)
+
+        if lines is not None:
+            lines[line_key] = line
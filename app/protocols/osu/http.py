@@ -1,25 +1,106 @@
 
-from app.common.config import config_instance as config
+from app.config import config_instance as config
 from app.common.constants import ANCHOR_WEB_RESPONSE
+from app.objects.buffers import OutboundQueue, packet_key
 from app.clients.osu import OsuClient
 from app.common.helpers import ip
 from app.tasks import logins
 
+from twisted.internet.base import DelayedCall
 from twisted.python.failure import Failure
 from twisted.web.resource import Resource
+from twisted.internet import reactor
 from twisted.web.http import Request
 from twisted.web import server
-from queue import Queue, Empty
+from typing import Any
+from chio import PacketType
 
 import uuid
+import zlib
 import app
 
+# Long-polling will hold requests that don't contain any packets until
+# there is data to send back, or the timeout expired. This only works
+# well with clients that are able to send multiple requests at once,
+# since outgoing packets would otherwise be delayed by the held request.
+LONGPOLL_ENABLED = config.BANCHO_LONGPOLL
+LONGPOLL_TIMEOUT = config.BANCHO_LONGPOLL_TIMEOUT
+
+# Responses above this size will be compressed,
+# if the client sent a matching accept-encoding
+COMPRESSION_THRESHOLD = config.BANCHO_HTTP_COMPRESSION_THRESHOLD
+COMPRESSION_LEVEL = config.BANCHO_HTTP_COMPRESSION_LEVEL
+COMPRESSION_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS
+}
+
+def select_encoding(request: Request) -> str | None:
+    """Select the preferred content encoding from the accept-encoding header"""
+    if not (header := request.getHeader('accept-encoding')):
+        return None
+
+    accepted = {}
+
+    for entry in header.lower().split(','):
+        name, _, parameters = entry.partition(';')
+        parameters = parameters.strip()
+        quality = 1.0
+
+        if parameters.startswith('q='):
+            try:
+                quality = float(parameters[2:])
+            except ValueError:
+                quality = 0.0
+
+        accepted[name.strip()] = quality
+
+    for encoding in COMPRESSION_WBITS:
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+
+    return None
+
+def encode_response(request: Request, data: bytes) -> bytes:
+    """Compress the response body, if it's large enough. This should not be run on the reactor thread."""
+    if len(data) < COMPRESSION_THRESHOLD:
+        app.session.http_compression.increment('skipped')
+        return data
+
+    if not (encoding := select_encoding(request)):
+        app.session.http_compression.increment('skipped')
+        return data
+
+    compressor = zlib.compressobj(
+        COMPRESSION_LEVEL,
+        zlib.DEFLATED,
+        COMPRESSION_WBITS[encoding]
+    )
+    compressed = compressor.compress(data) + compressor.flush()
+
+    app.session.http_compression.increment('compressed')
+    app.session.http_compression.increment('bytes_in', len(data))
+    app.session.http_compression.increment('bytes_out', len(compressed))
+    app.session.logger.debug(
+        f'Compressed response with {encoding}: '
+        f'{len(data)} -> {len(compressed)} bytes '
+        f'({len(compressed) / len(data):.2%})'
+    )
+
+    request.setHeader('content-encoding', encoding)
+    request.setHeader('vary', 'accept-encoding')
+    return compressed
+
 class HttpOsuClient(OsuClient):
     def __init__(self, address: str, port: int) -> None:
         super().__init__(address, port)
         self.protocol = 'http'
-        self.queue = Queue()
+        self.queue = OutboundQueue(
+            on_overflow=lambda: self.close_connection('Outbound budget exceeded')
+        )
         self.token = ""
+        self.held_request: Request | None = None
+        self.held_timeout: DelayedCall | None = None
 
     @property
     def connected(self) -> bool:
@@ -41,26 +122,86 @@ class HttpOsuClient(OsuClient):
         super().close_connection(reason)
         self.token = ""
 
+        if self.held_request is not None:
+            reactor.callFromThread(self.release_held_request)
+
     def enqueue_packet(self, packet, *args):
         data = self.io.write_packet_to_bytes(packet, *args)
         self.logger.debug('<- "%s": %r', packet.name, args)
-        self.enqueue(data)
+        self.enqueue(data, packet, packet_key(packet, args))
 
-    def enqueue(self, data: bytes):
-        self.queue.put(data)
+    def enqueue(self, data: bytes, packet: PacketType | None = None, key: Any = None):
+        self.queue.put(data, packet, key)
 
-    def dequeue(self, max_size=2**15) -> bytes:
-        chunks: list[bytes] = []
-        total = 0
+        if self.held_request is not None:
+            # Wake up the pending poll request
+            reactor.callFromThread(self.release_held_request)
 
-        while total < max_size:
-            try:
-                chunk = self.queue.get_nowait()
-            except Empty:
-                break
+    def hold_request(self, request: Request, timeout: float) -> None:
+        """Hold a poll request until data was enqueued or the timeout expired. Must be run on the reactor thread."""
+        # Only one request can be held at a time
+        self.release_held_request()
+
+        self.held_request = request
+        self.held_timeout = reactor.callLater(timeout, self.release_held_request, timed_out=True)
+        request.notifyFinish().addErrback(lambda _: self.discard_held_request(request))
+        app.session.http_longpoll.increment('held')
+        app.session.http_longpoll.increment('active')
+
+        if not self.queue.empty():
+            # Data was enqueued while we were setting up the request
+            self.release_held_request()
+
+    def release_held_request(self, timed_out: bool = False) -> None:
+        """Answer the currently held request with all queued data. Must be run on the reactor thread."""
+        if not (request := self.discard_held_request()):
+            return
+
+        app.session.http_longpoll.increment(
+            'timeouts' if timed_out else 'woken'
+        )
+
+        if request.finished or request._disconnected:
+            return
+
+        data = self.dequeue()
+
+        if len(data) >= COMPRESSION_THRESHOLD:
+            # Compress response off the reactor thread
+            d = app.session.tasks.defer_to_reactor_thread(encode_response, request, data)
+            d.addCallback(lambda result: self.finish_request(request, result))
+            return
 
-            chunks.append(chunk)
-            total += len(chunk)
+        self.finish_request(request, data)
+
+    def finish_request(self, request: Request, data: bytes) -> None:
+        if request.finished or request._disconnected:
+            return
+
+        request.setHeader('connection', 'keep-alive')
+        request.write(data)
+        request.finish()
+
+    def discard_held_request(self, request: Request | None = None) -> Request | None:
+        held_request = self.held_request
+
+        if held_request is None:
+            return None
+
+        if request is not None and request is not held_request:
+            # Request was already released
+            return None
+
+        if self.held_timeout and self.held_timeout.active():
+            self.held_timeout.cancel()
+
+        self.held_request = None
+        self.held_timeout = None
+        app.session.http_longpoll.decrement('active')
+        return held_request
+
+    def dequeue(self, max_size=2**15) -> bytes:
+        chunks = self.queue.pop(max_size)
 
         if not chunks:
             return b""
@@ -74,7 +215,10 @@ class HttpOsuHandler(Resource):
     isLeaf = True
 
     def handle_login_request(self, request: Request):
-        d = logins.manager.submit(self.process_login, request)
+        d = logins.manager.submit(
+            self.process_login, request,
+            abandoned=lambda: request._disconnected
+        )
         d.addCallback(self.on_login_success, request)
         d.addErrback(self.on_login_error, request)
         return server.NOT_DONE_YET
@@ -100,7 +244,7 @@ class HttpOsuHandler(Resource):
             request.getClientAddress().port
         )
 
-        if hash(player.address) in app.session.blocked_connections:
+        if player.address in app.session.blocked_connections:
             player.logger.warning(f'Blocked connection from {player.address}')
             request.setHeader('connection', 'close')
             request.setResponseCode(400)
@@ -128,7 +272,7 @@ class HttpOsuHandler(Resource):
             player.token
         )
 
-        return player.dequeue()
+        return encode_response(request, player.dequeue())
 
     def on_login_success(self, result: bytes, request: Request) -> None:
         if request.finished or request._disconnected:
@@ -153,15 +297,27 @@ class HttpOsuHandler(Resource):
         request.finish()
 
     def handle_request(self, player: HttpOsuClient, request: Request):
-        d = app.session.tasks.defer_to_reactor_thread(self.process_request, player, request)
+        app.session.http_requests_per_minute.record()
+        request_data = request.content.read()
+
+        if LONGPOLL_ENABLED and not request_data and player.queue.empty():
+            # Nothing to process & nothing to send back, so we
+            # wait until there is new data for this client
+            player.hold_request(request, LONGPOLL_TIMEOUT)
+            return server.NOT_DONE_YET
+
+        # Answer pending poll request, since the client moved on
+        player.release_held_request()
+
+        d = app.session.tasks.defer_to_reactor_thread(self.process_request, player, request, request_data)
         d.addErrback(self.on_request_error, player, request)
         d.addCallback(self.on_request_success, request)
         return server.NOT_DONE_YET
 
-    def process_request(self, player: HttpOsuClient, request: Request) -> bytes:
-        packets = player.io.read_many_packets_from_bytes(request.content.read())
+    def process_request(self, player: HttpOsuClient, request: Request, request_data: bytes) -> bytes:
+        packets = player.io.read_many_packets_from_bytes(request_data)
         player.on_packets_received(packets)
-        return player.dequeue()
+        return encode_response(request, player.dequeue())
 
     def on_request_success(self, result: bytes, request: Request) -> None:
         if request.finished or request._disconnected:
@@ -8,7 +8,12 @@ class SupportsEnqueue(Protocol[T]):
         ...
 
 class ByteStream:
-    """Helper class for streams in twisted"""
+    """
+    Helper class for streams in twisted.
+    Reads return copies, since chio decodes strings from them with bytes.decode().
+    Consumed data is released with "del buffer[:offset]", which CPython handles by
+    moving the start of the bytearray, instead of moving the remaining data.
+    """
 
     __slots__ = ('offset', 'buffer', 'target')
 
@@ -4,9 +4,13 @@ from twisted.internet.error import ConnectionDone
 from twisted.internet.protocol import Protocol
 from twisted.python.failure import Failure
 from twisted.internet import reactor
+from typing import Any
+from chio import PacketType
 
 from app.common.config import config_instance as config
 from app.protocols.osu.streams import ByteStream
+from app.objects.buffers import WriteBuffer, packet_key
+from app.objects.mailbox import Mailbox
 from app.common.helpers import location
 from app.clients.osu import OsuClient
 from app.tasks import logins
@@ -22,6 +26,11 @@ class TcpOsuClient(OsuClient, Protocol):
         super().__init__(address.host, address.port)
         self.is_local = location.is_local_ip(address.host)
         self.stream = ByteStream(self)
+        self.outbound = WriteBuffer(
+            self.write_chunks,
+            on_overflow=self.on_outbound_overflow
+        )
+        self.inbound = Mailbox(self.on_packets_received, self.on_processing_error)
         self.protocol = 'tcp'
         self.busy = False
 
@@ -29,37 +38,48 @@ class TcpOsuClient(OsuClient, Protocol):
         if self.is_local and not config.DEBUG:
             self.logger.info(f'-> <{self.address}:{self.port}>')
 
-        if hash(self.address) in app.session.blocked_connections:
-            self.logger.warning(f'Blocked connection from {self.address}')
-            self.close_connection('Blocked IP')
-
         # Enable TCP_NODELAY for lower latency &
         # set TCP keepalive for detecting dead connections
         self.transport.setTcpNoDelay(True)
         self.transport.setTcpKeepAlive(True)
 
+        # Keep data inside our outbound buffer, while
+        # the transport is unable to send it
+        self.transport.registerProducer(self.outbound, True)
+
     def connectionLost(self, reason: Failure = Failure(ConnectionDone())):
+        app.session.admission.release(self.address)
         app.session.tasks.defer_to_queue(
             self.on_connection_lost,
             reason.getErrorMessage(),
             was_clean=(reason.type == ConnectionDone)
         )
 
-    def enqueue(self, data: bytes) -> None:
+    def enqueue(self, data: bytes, packet: PacketType | None = None, key: Any = None) -> None:
+        self.outbound.write(data, packet, key)
+
+    def write_chunks(self, chunks: list[bytes]) -> None:
         try:
-            self.transport.write(data)
+            # Pass all buffered packets to the transport at once
+            self.transport.writeSequence(chunks)
         except Exception as e:
             self.logger.critical(f'Failed to write to transport layer: {e}', exc_info=e)
             self.close_connection('Transport write error')
 
     def enqueue_packet(self, packet, *args):
-        self.io.write_packet(self.stream, packet, *args)
+        data = self.io.write_packet_to_bytes(packet, *args)
         self.logger.debug('<- "%s": %r', packet.name, args)
+        self.enqueue(data, packet, packet_key(packet, args))
 
     def close_connection(self, reason: str = "") -> None:
         reactor.callFromThread(self.transport.loseConnection)
         super().close_connection(reason)
 
+    def on_outbound_overflow(self) -> None:
+        # Abort instead of flushing the backlog to a client, that can't keep up
+        reactor.callFromThread(self.outbound.abort, self.transport)
+        super().close_connection('Outbound budget exceeded')
+
     def dataReceived(self, data: bytes):
         """
         Will handle the initial login request and then switch to
@@ -104,7 +124,8 @@ class TcpOsuClient(OsuClient, Protocol):
                 super().on_login_received,
                 username.decode(),
                 password.decode(),
-                client.decode()
+                client.decode(),
+                abandoned=lambda: not self.transport.connected
             )
 
             deferred.addErrback(
@@ -158,16 +179,11 @@ class TcpOsuClient(OsuClient, Protocol):
         if not packets:
             return
 
-        deferred = app.session.tasks.defer_to_reactor_thread(
-            self.on_packets_received,
-            packets
-        )
-        deferred.addErrback(
-            lambda f: (
-                self.logger.error(f'Error while processing packet: {f.getErrorMessage()}', exc_info=f.value),
-                self.close_connection(f.getErrorMessage())
-            )
-        )
+        self.inbound.put(*packets)
+
+    def on_processing_error(self, e: Exception) -> None:
+        self.logger.error(f'Error while processing packet: {e}', exc_info=e)
+        self.close_connection(str(e))
 
     def handleHttpRequest(self, data: bytes) -> None:
         self.logger.debug(f'Received http request: {data}')
@@ -2,9 +2,18 @@
 
 from autobahn.twisted.websocket import WebSocketServerProtocol
 from autobahn.websocket.protocol import ConnectionRequest
+from autobahn.websocket.compress import (
+    PerMessageDeflateOfferAccept,
+    PerMessageCompressOffer,
+    PerMessageDeflateOffer
+)
 from twisted.internet import reactor
+from typing import List, Any
 from chio import PacketType
 
+from app.config import config_instance as config
+from app.objects.buffers import WriteBuffer, packet_key
+from app.objects.mailbox import Mailbox
 from app.protocols.osu.streams import ByteStream
 from app.clients.osu import OsuClient
 from app.common.helpers import ip
@@ -13,6 +22,18 @@ from app.tasks import logins
 import logging
 import app
 
+# Negotiate permessage-deflate, if the client offers it
+COMPRESSION_ENABLED = config.BANCHO_WS_COMPRESSION
+COMPRESSION_MEM_LEVEL = config.BANCHO_WS_COMPRESSION_MEM_LEVEL
+
+def accept_compression(offers: List[PerMessageCompressOffer]) -> PerMessageDeflateOfferAccept | None:
+    """Accept the first permessage-deflate offer of a client"""
+    for offer in offers:
+        if isinstance(offer, PerMessageDeflateOffer):
+            return PerMessageDeflateOfferAccept(offer, mem_level=COMPRESSION_MEM_LEVEL)
+
+    return None
+
 class WebsocketOsuClient(WebSocketServerProtocol):
     """This class implements the websocket osu connection, mainly used for oldsu! clients."""
 
@@ -21,6 +42,11 @@ class WebsocketOsuClient(WebSocketServerProtocol):
         self.logger = logging.getLogger('websockets')
         self.player = OsuClient(None, None)
         self.stream = ByteStream(self)
+        self.outbound = WriteBuffer(
+            self.send_chunks,
+            on_overflow=self.on_outbound_overflow
+        )
+        self.inbound = Mailbox(self.player.on_packets_received, self.on_processing_error)
         self.player.protocol = 'ws'
         self.player.enqueue = self.enqueue
 
@@ -35,11 +61,22 @@ class WebsocketOsuClient(WebSocketServerProtocol):
         self.player.enqueue_packet = self.enqueue_packet
         self.logger.info(f'-> <{self.address}>')
 
-        if hash(self.address) in app.session.blocked_connections:
+        if self.address in app.session.blocked_connections:
             self.logger.warning(f'Blocked connection from {self.address}')
             self.close_connection('Blocked IP')
 
+    def onOpen(self):
+        # Keep data inside our outbound buffer, while
+        # the transport is unable to send it
+        self.transport.registerProducer(self.outbound, True)
+
     def onClose(self, wasClean: bool, code: int, reason: str):
+        self.logger.debug(
+            f'<{self.address}> Sent {self.outbound.total_writes} packets in '
+            f'{self.trafficStats.outgoingWebSocketFrames} frames '
+            f'({self.trafficStats.outgoingOctetsAppLevel} bytes, '
+            f'{self.trafficStats.outgoingOctetsWebSocketLevel} bytes on the websocket level)'
+        )
         app.session.tasks.defer_to_queue(
             self.player.on_connection_lost,
             reason, wasClean
@@ -78,7 +115,8 @@ class WebsocketOsuClient(WebSocketServerProtocol):
             self.player.on_login_received,
             username.decode(),
             password.decode(),
-            client.decode()
+            client.decode(),
+            abandoned=lambda: not self.transport.connected
         )
 
         deferred.addErrback(
@@ -120,36 +158,48 @@ class WebsocketOsuClient(WebSocketServerProtocol):
         if not packets:
             return
 
-        deferred = app.session.tasks.defer_to_reactor_thread(
-            self.player.on_packets_received,
-            packets
-        )
-        deferred.addErrback(
-            lambda f: (
-                self.logger.error(f'Error while processing packet: {f.getErrorMessage()}', exc_info=f.value),
-                self.close_connection(f.getErrorMessage())
-            )
-        )
+        self.inbound.put(*packets)
+
+    def on_processing_error(self, e: Exception) -> None:
+        self.logger.error(f'Error while processing packet: {e}', exc_info=e)
+        self.close_connection(str(e))
 
     def enqueue_packet(self, packet: PacketType, *args) -> None:
-        self.player.io.write_packet(self.stream, packet, *args)
+        data = self.player.io.write_packet_to_bytes(packet, *args)
         self.logger.debug('<- "%s": %r', packet.name, args)
+        self.enqueue(data, packet, packet_key(packet, args))
 
-    def enqueue(self, data: bytes):
-        reactor.callFromThread(self.do_enqueue, data) # type: ignore
+    def enqueue(self, data: bytes, packet: PacketType | None = None, key: Any = None):
+        self.outbound.write(data, packet, key)
 
     def close_connection(self, reason: str = ""):
         reactor.callFromThread(self.do_close, reason) # type: ignore
         self.player.close_connection(reason)
 
-    def do_enqueue(self, data: bytes):
+    def on_outbound_overflow(self) -> None:
+        # Abort instead of flushing the backlog to a client, that can't keep up
+        reactor.callFromThread(self.outbound.abort, self.transport)
+        self.player.close_connection('Outbound budget exceeded')
+
+    def send_chunks(self, chunks: list[bytes]):
         if self.state != self.STATE_OPEN:
             self.logger.debug('Cannot send data to a closed channel')
             self.player.close_connection()
             return
 
+        # Send all packets of this tick inside a single frame
+        data = b''.join(chunks)
+        sent_bytes = self.trafficStats.outgoingOctetsWebSocketLevel
         self.sendMessage(data, isBinary=True)
 
+        app.session.websocket_traffic.increment('packets', len(chunks))
+        app.session.websocket_traffic.increment('frames')
+        app.session.websocket_traffic.increment('bytes_in', len(data))
+        app.session.websocket_traffic.increment(
+            'bytes_out',
+            self.trafficStats.outgoingOctetsWebSocketLevel - sent_bytes
+        )
+
     def do_close(self, reason: str | None = "") -> None:
         if self.state == self.STATE_CLOSED:
             # Connection is already closed
@@ -5,7 +5,7 @@ from twisted.internet.interfaces import IAddress
 from twisted.web.server import Site
 from typing import Optional
 
-from .protocols.osu.ws import WebsocketOsuClient
+from .protocols.osu.ws import WebsocketOsuClient, COMPRESSION_ENABLED, accept_compression
 from .protocols.osu.http import HttpOsuHandler
 from .protocols.osu.tcp import TcpOsuClient
 from .protocols.irc.tcp import TcpIrcProtocol
@@ -22,6 +22,10 @@ class TcpBanchoFactory(Factory):
         app.session.logger.warning(f'Stopping factory: {self}')
 
     def buildProtocol(self, addr: IAddress) -> Optional[Protocol]:
+        if not app.session.admission.admit(addr.host):
+            # Connection was rejected
+            return None
+
         client = self.protocol(addr)
         client.factory = self
         return client
@@ -41,6 +45,9 @@ class WebsocketBanchoFactory(WebSocketServerFactory):
         super().__init__()
         self.protocol = WebsocketOsuClient
 
+        if COMPRESSION_ENABLED:
+            self.setProtocolOptions(perMessageCompressionAccept=accept_compression)
+
     def startFactory(self):
         app.session.logger.info(f'Starting factory: {self}')
 
@@ -56,7 +63,11 @@ class TcpIrcFactory(Factory):
     def stopFactory(self):
         app.session.logger.warning(f'Stopping factory: {self}')
 
-    def buildProtocol(self, addr: IAddress) -> TcpIrcProtocol:
+    def buildProtocol(self, addr: IAddress) -> Optional[TcpIrcProtocol]:
+        if not app.session.admission.admit(addr.host):
+            # Connection was rejected
+            return None
+
         client = self.protocol(addr)
         client.factory = self
         return client
@@ -3,10 +3,12 @@ from .objects.collections import Players, Channels, Matches
 from .common.helpers.beatmaps import BeatmapResources
 from .common.helpers.filter import ChatFilter
 from .common.cache.events import EventQueue
-from .monitoring import RequestCounter
+from .admission import AdmissionControl
+from .objects.blocklist import Blocklist
+from .monitoring import RequestCounter, HitRateCounter, MovingAverage, Counters
 from .common.database import Postgres
 from .common.storage import Storage
-from .common.config import Config
+from .config import Config
 from .tasks import Tasks
 
 from typing import Callable, Dict, TYPE_CHECKING
@@ -57,10 +59,21 @@ requests.mount('https://', HTTPAdapter(max_retries=retries))
 
 packets_per_minute = RequestCounter(window=60)
 logins_per_minute = RequestCounter(window=60)
+packet_cache = HitRateCounter()
+http_requests_per_minute = RequestCounter(window=60)
+http_longpoll = Counters('held', 'active', 'woken', 'timeouts')
+http_compression = Counters('compressed', 'skipped', 'bytes_in', 'bytes_out')
+outbound_budget = Counters('dropped', 'coalesced', 'disconnects')
+inbound_mailbox = Counters('items', 'handoffs')
+status_updates = Counters('received', 'distributed')
+websocket_traffic = Counters('packets', 'frames', 'bytes_in', 'bytes_out')
+packet_latency = MovingAverage(alpha=0.05, half_life=2.0)
+presence_broadcasts = Counters('broadcasts', 'recipients', 'saved')
 
 osu_handlers: Dict[PacketType, Callable] = {}
 irc_handlers: Dict[str, Callable] = {}
-blocked_connections = set()
+blocked_connections = Blocklist()
+admission = AdmissionControl()
 filters = ChatFilter()
 channels = Channels()
 players = Players()
@@ -6,6 +6,7 @@ from twisted.internet.defer import Deferred
 from typing import Callable, Dict, Tuple
 from contextlib import suppress
 from app.common import officer
+from app import tracing
 from threading import Thread
 
 import itertools
@@ -104,7 +105,12 @@ class Tasks:
         Schedule a function to be called later with a given priority.
         Lower numbers indicate higher priority.
         """
-        with suppress(RuntimeError):
+        span = tracing.child_span(
+            'do_later',
+            function=getattr(function, '__name__', None)
+        )
+
+        with suppress(RuntimeError), span:
             self.do_later_executor.submit(
                 function, *args, priority=priority, **kwargs
             )
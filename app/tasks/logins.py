@@ -1,54 +1,281 @@
 
-from app.common.config import config_instance as config
+from app.config import config_instance as config
+from concurrent.futures import ProcessPoolExecutor
 from twisted.internet.defer import Deferred
-from functools import cache
-from typing import Callable
+from app.objects.caching import LRUCache
+from app.monitoring import Counters
+from typing import Callable, Deque
+from dataclasses import dataclass
+from collections import deque
+from threading import Lock
 
+import multiprocessing
+import hashlib
+import signal
 import bcrypt
+import time
 import app
 
+# Size of the process pool used for bcrypt, so that
+# password checks don't compete with packet handling for the GIL
+BCRYPT_WORKERS = config.BANCHO_BCRYPT_WORKERS
+
+# Verified passwords are cached for a limited time
+PASSWORD_CACHE_SIZE = 2**13
+PASSWORD_CACHE_TTL = 60 * 60
+
+# Client verification results, keyed by (identifier, date, md5)
+# Unknown executables are cached for a shorter time
+VERIFICATION_CACHE_SIZE = 2**12
+VERIFICATION_CACHE_TTL = 60 * 60 * 24
+VERIFICATION_NEGATIVE_TTL = 60 * 5
+
+# Bounds for the amount of logins, that are processed at the same time
+MIN_CONCURRENT_LOGINS = 2
+MAX_CONCURRENT_LOGINS = max(MIN_CONCURRENT_LOGINS, config.BANCHO_WORKERS // 2)
+
+# The concurrency limit is lowered, once logins or packets are slower than this
+LOGIN_LATENCY_TARGET = 2.0
+PACKET_LATENCY_TARGET = 0.1
+
+# The limit is lowered at most once per interval, by this factor
+LIMIT_DECREASE_FACTOR = 0.75
+LIMIT_DECREASE_INTERVAL = 1.0
+
+# Waiting logins are dropped after this many seconds
+LOGIN_QUEUE_TIMEOUT = 30
+
+class LoginQueueTimeout(Exception):
+    pass
+
+@dataclass
+class PendingLogin:
+    function: Callable
+    args: tuple
+    kwargs: dict
+    deferred: Deferred
+    deadline: float
+    abandoned: Callable[[], bool] | None
+
 class LoginManager:
-    def __init__(self) -> None:
-        self.packet_threshold = 10000 * (config.BANCHO_WORKERS // 6)
-        self.login_threshold = 100 * (config.BANCHO_WORKERS // 8)
-        self.login_priority = 1
+    """
+    Runs logins with an adaptive concurrency limit (AIMD). The limit grows by
+    one for every "round" of logins, that completed within the latency targets,
+    and shrinks by a constant factor as soon as logins or packet handling slow down.
+    Logins over the limit wait inside a FIFO queue, until a slot is freed up.
+    """
 
-    @property
-    def queue_enabled(self) -> bool:
-        return (
-            app.session.logins_per_minute.rate > self.login_threshold or
-            app.session.packets_per_minute.rate > self.packet_threshold
+    def __init__(self) -> None:
+        self.limit = float(max(MIN_CONCURRENT_LOGINS, MAX_CONCURRENT_LOGINS // 2))
+        self.waiting: Deque[PendingLogin] = deque()
+        self.last_decrease = 0.0
+        self.active = 0
+        self.lock = Lock()
+        self.counters = Counters(
+            'completed', 'queued', 'expired',
+            'abandoned', 'decreases'
+        )
+        self.password_cache: LRUCache[tuple, bool] = LRUCache(
+            PASSWORD_CACHE_SIZE,
+            PASSWORD_CACHE_TTL
+        )
+        self.verification_cache: LRUCache[tuple, bool] = LRUCache(
+            VERIFICATION_CACHE_SIZE,
+            VERIFICATION_CACHE_TTL
         )
+        self.bcrypt_executor: ProcessPoolExecutor | None = None
 
     def submit(
         self,
         function: Callable,
         *args,
+        abandoned: Callable[[], bool] | None = None,
         **kwargs
     ) -> Deferred:
         """
         Wrapper function for submitting login tasks. This is required to
         ensure that the server won't be overloaded with login requests,
-        after a certain amount of users have been reached.
+        e.g. when all players reconnect after a restart.
+        The optional "abandoned" callback is used to skip logins of clients,
+        that have disconnected while waiting.
         """
-        if self.queue_enabled:
-            return app.session.tasks.defer_to_queue(
-                function, *args, **kwargs,
-                priority=self.login_priority
+        pending = PendingLogin(
+            function, args, kwargs,
+            Deferred(),
+            time.monotonic() + LOGIN_QUEUE_TIMEOUT,
+            abandoned
+        )
+
+        with self.lock:
+            self.waiting.append(pending)
+
+            if len(self.waiting) > 1 or self.active >= int(self.limit):
+                self.counters.increment('queued')
+
+        self.dispatch()
+        return pending.deferred
+
+    def dispatch(self) -> None:
+        """Start waiting logins in order, while there are free slots"""
+        while True:
+            with self.lock:
+                if not self.waiting or self.active >= int(self.limit):
+                    return
+
+                pending = self.waiting.popleft()
+
+                if pending.abandoned and pending.abandoned():
+                    self.counters.increment('abandoned')
+                    continue
+
+                if pending.deadline <= time.monotonic():
+                    self.counters.increment('expired')
+                    expired = True
+                else:
+                    self.active += 1
+                    expired = False
+
+            if expired:
+                pending.deferred.errback(LoginQueueTimeout('Login queue timeout'))
+                continue
+
+            self.start(pending)
+
+    def start(self, pending: PendingLogin) -> None:
+        started_at = time.monotonic()
+
+        def on_done(result):
+            self.on_login_done(time.monotonic() - started_at)
+            return result
+
+        deferred = app.session.tasks.defer_to_reactor_thread(
+            pending.function,
+            *pending.args,
+            **pending.kwargs
+        )
+        deferred.addBoth(on_done)
+        deferred.chainDeferred(pending.deferred)
+
+    def on_login_done(self, latency: float) -> None:
+        now = time.monotonic()
+
+        with self.lock:
+            self.active -= 1
+            self.counters.increment('completed')
+
+            overloaded = (
+                latency > LOGIN_LATENCY_TARGET or
+                app.session.packet_latency.value > PACKET_LATENCY_TARGET
             )
 
-        return app.session.tasks.defer_to_reactor_thread(
-            function,
-            *args,
-            **kwargs
+            saturated = (
+                self.waiting or
+                self.active + 1 >= int(self.limit)
+            )
+
+            if not overloaded:
+                if saturated:
+                    # Additive increase, by one per full round of logins
+                    self.limit = min(MAX_CONCURRENT_LOGINS, self.limit + 1 / self.limit)
+
+            elif now - self.last_decrease >= LIMIT_DECREASE_INTERVAL:
+                # Multiplicative decrease
+                self.limit = max(MIN_CONCURRENT_LOGINS, self.limit * LIMIT_DECREASE_FACTOR)
+                self.last_decrease = now
+                self.counters.increment('decreases')
+
+        self.dispatch()
+
+    def expire_waiting(self) -> None:
+        """Drop waiting logins, whose deadline has passed or whose client has disconnected"""
+        now = time.monotonic()
+        expired = []
+
+        with self.lock:
+            remaining: Deque[PendingLogin] = deque()
+
+            for pending in self.waiting:
+                if pending.abandoned and pending.abandoned():
+                    self.counters.increment('abandoned')
+                    continue
+
+                if pending.deadline <= now:
+                    self.counters.increment('expired')
+                    expired.append(pending)
+                    continue
+
+                remaining.append(pending)
+
+            self.waiting = remaining
+
+        for pending in expired:
+            pending.deferred.errback(LoginQueueTimeout('Login queue timeout'))
+
+    def check_password(self, password: str, hashed: str, user_id: int | None = None) -> bool:
+        # Cache keys don't contain the plain password hash
+        key = (
+            user_id,
+            hashed,
+            hashlib.sha256(password.encode()).digest()
         )
 
-    @staticmethod
-    @cache
-    def check_password(password: str, hashed: str) -> bool:
-        return bcrypt.checkpw(
+        if (result := self.password_cache.get(key)) is not None:
+            return result
+
+        result = self.executor.submit(
+            bcrypt.checkpw,
             password.encode(),
             hashed.encode()
+        ).result()
+
+        self.password_cache.set(key, result)
+        return result
+
+    def invalidate_password(self, user_id: int) -> None:
+        """Remove all cached password checks of a user, e.g. after a password change"""
+        self.password_cache.remove_where(lambda key: key[0] == user_id)
+
+    def verify_client(self, identifier: str, date: int, md5: str, verify: Callable[[], bool]) -> bool:
+        """Check if a client executable is valid, using the verification cache"""
+        key = (identifier, date, md5)
+
+        if (result := self.verification_cache.get(key)) is not None:
+            return result
+
+        result = bool(verify())
+        self.verification_cache.set(
+            key, result,
+            ttl=None if result else VERIFICATION_NEGATIVE_TTL
         )
+        return result
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self.bcrypt_executor is not None:
+            return self.bcrypt_executor
+
+        with self.lock:
+            # Concurrent password checks would otherwise create a pool each
+            if self.bcrypt_executor is not None:
+                return self.bcrypt_executor
+
+            # Workers are spawned instead of forked, since forking a multithreaded
+            # process is unsafe. The initializer & bcrypt.checkpw are resolved without
+            # importing "app", so workers don't load the server. Shutdown is handled
+            # by the main process, which is why workers ignore interrupts.
+            self.bcrypt_executor = ProcessPoolExecutor(
+                max_workers=BCRYPT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=signal.signal,
+                initargs=(signal.SIGINT, signal.SIG_IGN)
+            )
+            return self.bcrypt_executor
+
+    def shutdown(self) -> None:
+        with self.lock:
+            executor, self.bcrypt_executor = self.bcrypt_executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
 manager = LoginManager()
@@ -1,4 +1,5 @@
 
+from app.tasks.logins import manager as login_manager
 from app.session import config
 from chio import PacketType
 
@@ -7,6 +8,7 @@ import app
 
 PING_INTERVAL_IRC = 30
 PING_INTERVAL_OSU = 12
+LOGIN_QUEUE_INTERVAL = 5
 
 @app.session.tasks.submit(interval=PING_INTERVAL_OSU, threaded=True)
 def osu_tcp_pings() -> None:
@@ -73,3 +75,11 @@ def osu_http_housekeeping() -> None:
 
         if player.inactive:
             player.close_connection('Client timed out')
+
+@app.session.tasks.submit(interval=LOGIN_QUEUE_INTERVAL)
+def login_queue_timeouts() -> None:
+    """
+    This task will remove waiting logins from the login queue, once their
+    client has disconnected or they have been waiting for too long.
+    """
+    login_manager.expire_waiting()
@@ -0,0 +1,11 @@
+
+from app import tracing
+
+import app
+
+TRACE_FLUSH_INTERVAL = 5
+
+@app.session.tasks.submit(interval=TRACE_FLUSH_INTERVAL, threaded=True)
+def flush_traces() -> None:
+    """Append all buffered spans to the trace file"""
+    tracing.exporter.flush()
@@ -0,0 +1,222 @@
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List
+from functools import wraps
+from threading import Lock
+
+from app.config import config_instance as config
+from app.monitoring import Counters
+
+import itertools
+import logging
+import random
+import json
+import time
+import app
+import os
+
+# Tracing is disabled by default, in which case spans cost one function call
+TRACING_ENABLED = config.BANCHO_TRACING
+
+# Fraction of traces that get exported to the trace file
+TRACING_SAMPLE_RATE = config.BANCHO_TRACING_SAMPLE_RATE
+
+# Spans slower than this are logged & their trace is always exported
+TRACING_SLOW_SPAN_MS = config.BANCHO_TRACING_SLOW_MS
+
+# Exported spans are buffered up to this amount, before new ones get dropped
+TRACING_MAX_BUFFERED_SPANS = 2**16
+
+logger = logging.getLogger('tracing')
+current: ContextVar["Span | None"] = ContextVar('span', default=None)
+counters = Counters('traces', 'sampled', 'slow', 'exported', 'dropped')
+enabled = TRACING_ENABLED
+identifiers = itertools.count(1)
+
+class Trace:
+    """A tree of spans, which started from a single root span"""
+
+    __slots__ = ('id', 'sampled', 'slow', 'spans', 'timestamp')
+
+    def __init__(self) -> None:
+        self.id = f'{os.getpid():x}-{next(identifiers):x}'
+        self.sampled = random.random() < TRACING_SAMPLE_RATE
+        self.timestamp = time.time()
+        self.spans: List[Span] = []
+        self.slow = False
+
+class Span:
+    __slots__ = ('id', 'name', 'trace', 'parent', 'attributes', 'start', 'duration', 'token')
+
+    def __init__(self, name: str, trace: Trace, parent: "Span | None", attributes: Dict[str, Any]) -> None:
+        self.id = next(identifiers)
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.attributes = attributes
+        self.duration = 0.0
+        self.start = 0.0
+        self.token = None
+
+    def __repr__(self) -> str:
+        return f'<Span "{self.name}" ({self.duration * 1000:.2f}ms)>'
+
+    def __enter__(self) -> "Span":
+        self.token = current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.duration = time.perf_counter() - self.start
+        current.reset(self.token)
+
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+
+        finish(self)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace': self.trace.id,
+            'span': self.id,
+            'parent': self.parent.id if self.parent else None,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes
+        }
+
+class NoopSpan:
+    """Returned for all spans, while tracing is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def set(self, **attributes) -> None:
+        pass
+
+noop = NoopSpan()
+
+class Exporter:
+    """Buffers finished traces & appends them to a JSONL file, one span per line"""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.buffer: List[Dict[str, Any]] = []
+        self.path = path
+        self.lock = Lock()
+
+    def submit(self, trace: Trace) -> None:
+        with self.lock:
+            if len(self.buffer) + len(trace.spans) > TRACING_MAX_BUFFERED_SPANS:
+                counters.increment('dropped', len(trace.spans))
+                return
+
+            self.buffer.extend(span.to_dict() for span in trace.spans)
+
+    def flush(self) -> int:
+        with self.lock:
+            spans, self.buffer = self.buffer, []
+
+        if not spans or not self.path:
+            return 0
+
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(span, default=str) + '\n' for span in spans)
+
+        counters.increment('exported', len(spans))
+        return len(spans)
+
+exporter = Exporter()
+
+def span(name: str, **attributes) -> Span | NoopSpan:
+    """Open a span as a child of the current one, or start a new trace"""
+    if not enabled:
+        return noop
+
+    parent = current.get()
+    trace = parent.trace if parent else Trace()
+    return Span(name, trace, parent, attributes)
+
+def child_span(name: str, **attributes) -> Span | NoopSpan:
+    """Open a span only if there is an active trace, e.g. for database or redis calls"""
+    if not enabled:
+        return noop
+
+    if (parent := current.get()) is None:
+        return noop
+
+    return Span(name, parent.trace, parent, attributes)
+
+def finish(span: Span) -> None:
+    trace = span.trace
+    trace.spans.append(span)
+
+    if span.duration * 1000 >= TRACING_SLOW_SPAN_MS:
+        logger.warning(f'Slow span "{span.name}" took {span.duration * 1000:.2f}ms ({span.attributes})')
+        counters.increment('slow')
+        trace.slow = True
+
+    if span.parent is not None:
+        return
+
+    counters.increment('traces')
+
+    if trace.sampled:
+        counters.increment('sampled')
+
+    if trace.sampled or trace.slow:
+        exporter.submit(trace)
+
+def traced(name: str, child: bool = False) -> Callable:
+    """Decorator, which wraps every call of a function inside a span"""
+    def wrapper(func: Callable) -> Callable:
+        open_span = child_span if child else span
+
+        @wraps(func)
+        def inner(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+
+            with open_span(name):
+                return func(*args, **kwargs)
+
+        return inner
+    return wrapper
+
+def instrument(database: Any, redis: Any) -> None:
+    """Attach child spans to database sessions & redis commands"""
+    managed_session = database.managed_session
+    execute_command = redis.execute_command
+
+    def traced_managed_session(*args, **kwargs):
+        with child_span('database.session'):
+            with managed_session(*args, **kwargs) as session:
+                yield session
+
+    def traced_execute_command(*args, **options):
+        with child_span('redis', command=args[0] if args else None):
+            return execute_command(*args, **options)
+
+    database.managed_session = contextmanager(traced_managed_session)
+    redis.execute_command = traced_execute_command
+
+def setup(path: str) -> None:
+    exporter.path = path
+
+    if not enabled:
+        return
+
+    instrument(app.session.database, app.session.redis)
+    logger.info(
+        f'Tracing enabled (sample rate: {TRACING_SAMPLE_RATE}, '
+        f'slow spans: {TRACING_SLOW_SPAN_MS}ms, export: "{path}")'
+    )
@@ -0,0 +1,97 @@
+"""
+Runs a login storm, where every login verifies a bcrypt password, and measures
+how long packets wait for a worker of the reactor's thread pool meanwhile.
+Passwords are verified either on the thread pool itself, or through the bcrypt
+process pool of the LoginManager.
+
+Usage: python -m benchmarks.bcrypt_pool [logins] [bcrypt rounds]
+"""
+
+from twisted.internet.defer import gatherResults
+from twisted.internet import reactor, threads
+from typing import Callable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.tasks.logins import LoginManager
+
+import statistics
+import bcrypt
+import time
+import sys
+
+# A packet is handled every few milliseconds, while the logins are running
+PACKET_INTERVAL = 0.005
+
+def check_password_threaded(password: str, hashed: str, user_id: int) -> bool:
+    """Verify the password on the thread pool, like before the process pool"""
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+def run(name: str, check_password: Callable, manager: "LoginManager", hashed: str, logins: int, done: Callable) -> None:
+    latencies = []
+    running = True
+
+    def handle_packet(submitted_at: float) -> None:
+        latencies.append(time.monotonic() - submitted_at)
+
+    def send_packet() -> None:
+        if not running:
+            return
+
+        threads.deferToThread(handle_packet, time.monotonic())
+        reactor.callLater(PACKET_INTERVAL, send_packet)
+
+    def on_logins_done(results) -> None:
+        nonlocal running
+        running = False
+        elapsed = time.monotonic() - start
+        latencies.sort()
+        manager.shutdown()
+
+        print(
+            f'{name:<8} {logins} logins in {elapsed:.2f}s, packet latency '
+            f'p50 {statistics.median(latencies) * 1000:.2f}ms, '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms, '
+            f'max {latencies[-1] * 1000:.2f}ms'
+        )
+        done()
+
+    start = time.monotonic()
+    send_packet()
+
+    # Every login belongs to another user, so that no password check is cached
+    deferreds = [
+        manager.submit(check_password, 'password', hashed, user_id)
+        for user_id in range(logins)
+    ]
+    gatherResults(deferreds).addCallback(on_logins_done)
+
+def main() -> None:
+    # Spawned bcrypt workers import this file as "__mp_main__", so
+    # the server is only loaded inside of the main process
+    from app.common.config import config_instance as config
+    from app.tasks.logins import LoginManager
+
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    hashed = bcrypt.hashpw(b'password', bcrypt.gensalt(rounds)).decode()
+    reactor.suggestThreadPoolSize(config.BANCHO_WORKERS)
+    print(f'{logins} logins with {rounds} bcrypt rounds, {config.BANCHO_WORKERS} workers')
+
+    process_manager = LoginManager()
+    thread_manager = LoginManager()
+
+    def run_process_pool() -> None:
+        run(
+            'process', process_manager.check_password,
+            process_manager, hashed, logins, reactor.stop
+        )
+
+    reactor.callWhenRunning(
+        run, 'thread', check_password_threaded,
+        thread_manager, hashed, logins, run_process_pool
+    )
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
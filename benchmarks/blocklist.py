@@ -0,0 +1,84 @@
+"""
+Loads a large amount of random ipv4 & ipv6 ranges into the blocklist,
+and measures how long reloading and the lookup on every accepted connection take.
+
+Usage: python -m benchmarks.blocklist [ranges] [lookups]
+"""
+
+from app.objects.blocklist import Blocklist
+from ipaddress import IPv4Address, IPv6Address
+from typing import List
+
+import tracemalloc
+import statistics
+import random
+import time
+import sys
+
+def random_ranges(count: int) -> List[str]:
+    ranges = []
+
+    for _ in range(count):
+        if random.random() < 0.8:
+            address = IPv4Address(random.getrandbits(32))
+            ranges.append(f'{address}/{random.randint(16, 32)}')
+        else:
+            address = IPv6Address(random.getrandbits(128))
+            ranges.append(f'{address}/{random.randint(32, 128)}')
+
+    return ranges
+
+def random_addresses(count: int) -> List[str]:
+    return [
+        str(IPv4Address(random.getrandbits(32)))
+        if random.random() < 0.8 else
+        str(IPv6Address(random.getrandbits(128)))
+        for _ in range(count)
+    ]
+
+def measure_lookups(blocklist: Blocklist, addresses: List[str]) -> List[float]:
+    latencies = []
+
+    for address in addresses:
+        start = time.perf_counter()
+        address in blocklist
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+def main() -> None:
+    range_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lookup_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    random.seed(0)
+    ranges = random_ranges(range_count)
+    blocklist = Blocklist()
+
+    start = time.perf_counter()
+    blocklist.load(ranges)
+    elapsed = time.perf_counter() - start
+
+    # Memory is measured separately, since tracing slows down the load
+    tracemalloc.start()
+    Blocklist().load(ranges)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'Loaded {len(blocklist)} ranges in {elapsed:.2f}s, {peak / 2**20:.1f}MB peak allocated')
+
+    # Addresses inside of blocked ranges walk the trie the furthest
+    blocked = [network.split('/')[0] for network in random.sample(ranges, lookup_count // 10)]
+    addresses = random_addresses(lookup_count)
+
+    for name, sample in (('allowed', addresses), ('blocked', blocked)):
+        latencies = sorted(measure_lookups(blocklist, sample))
+        matches = sum(address in blocklist for address in sample)
+
+        print(
+            f'{name:<8} {len(sample)} lookups, {matches} blocked, '
+            f'p50 {statistics.median(latencies) * 1e6:.2f}us, '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.2f}us'
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Broadcasts channel messages to a large irc channel and compares formatting the
+PRIVMSG line for every recipient, like TcpIrcProtocol did before, against
+formatting it once and writing the shared line into each outbound buffer.
+
+Usage: python -m benchmarks.irc_messages [recipients] [messages]
+"""
+
+from app.common.config import config_instance as config
+from app.protocols.irc.tcp import format_message_line
+from twisted.internet.testing import StringTransport
+from twisted.words.protocols.irc import IRC
+from app.objects.buffers import WriteBuffer
+from twisted.internet import reactor
+from typing import Callable, List
+from chio import Message
+
+import random
+import time
+import sys
+
+class Recipient(IRC):
+    """An irc protocol, which buffers its lines like TcpIrcProtocol"""
+
+    def __init__(self) -> None:
+        self.outbound = WriteBuffer(self.write_lines)
+        self.makeConnection(StringTransport())
+
+    def sendLine(self, line: str | bytes) -> None:
+        if isinstance(line, str):
+            line = line.encode(self.encoding or "utf-8")
+
+        self.outbound.write(line + b"\r\n")
+
+    def write_lines(self, lines: List[bytes]) -> None:
+        self.transport.writeSequence(lines)
+
+def flush() -> None:
+    # Run the flushes, which buffers have scheduled through callFromThread,
+    # like the next reactor iteration would
+    reactor.runUntilCurrent()
+
+def send_per_recipient(recipients: List[Recipient], message: Message) -> None:
+    """Format the line for every recipient, as enqueue_message_object did before"""
+    for recipient in recipients:
+        message_content = message.content
+
+        # Handle action messages (e.g. /me)
+        if message_content.startswith("\x01ACTION"):
+            message_content = (
+                f"*{message.sender} " +
+                message_content.removeprefix("\x01ACTION ").strip()
+            )
+
+        recipient.sendMessage(
+            "PRIVMSG",
+            message.target.replace(" ", "_"),
+            ":" + message_content,
+            prefix=(
+                f'{message.sender.replace(" ", "_")}!cho@{config.DOMAIN_NAME}'
+            )
+        )
+
+    flush()
+
+def send_shared(recipients: List[Recipient], message: Message) -> None:
+    line = format_message_line(message, message.target)
+
+    for recipient in recipients:
+        recipient.outbound.write(line)
+
+    flush()
+
+def measure(name: str, send: Callable, recipients: List[Recipient], messages: List[Message]) -> None:
+    start = time.process_time()
+
+    for message in messages:
+        send(recipients, message)
+
+    elapsed = time.process_time() - start
+    sent_bytes = sum(len(recipient.transport.value()) for recipient in recipients)
+
+    print(
+        f'{name:<14} {elapsed / len(messages) * 1000:.3f}ms cpu per message, '
+        f'{sent_bytes / 2**20:.1f}MB sent'
+    )
+
+    for recipient in recipients:
+        recipient.transport.clear()
+
+def main() -> None:
+    recipient_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    random.seed(0)
+    recipients = [Recipient() for _ in range(recipient_count)]
+    messages = [
+        Message(
+            sender=f'Player {index % 50}',
+            content=(
+                '\x01ACTION is listening to a song\x01'
+                if random.random() < 0.1 else
+                'hello, does anyone want to play a match?'
+            ),
+            target='#osu',
+            sender_id=index % 50
+        )
+        for index in range(message_count)
+    ]
+    print(f'{message_count} messages to {recipient_count} irc recipients')
+
+    measure('per recipient', send_per_recipient, recipients, messages)
+    measure('shared', send_shared, recipients, messages)
+
+if __name__ == "__main__":
+    main()
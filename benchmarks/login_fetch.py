@@ -0,0 +1,95 @@
+"""
+Measures the database part of a login, i.e. fetching the user with the
+relationships, groups & stats, which the login reads afterwards. Compares
+lazy loading of every attribute against OsuClient.fetch_user & the relationship
+query of the login. Reports the latency and the amount of sql queries per fetch.
+
+Usage: python -m benchmarks.login_fetch <username> [<username> ...] [--iterations N]
+"""
+
+from app.common.database.objects import DBUser
+from app.common.database import users
+from app.clients.osu import OsuClient
+from typing import Callable, List
+from sqlalchemy import event
+
+import statistics
+import time
+import sys
+import app
+
+client = OsuClient('127.0.0.1', 0)
+queries = 0
+
+@event.listens_for(app.session.database.engine, 'before_cursor_execute')
+def count_query(*args) -> None:
+    global queries
+    queries += 1
+
+def fetch_lazy(name: str) -> DBUser | None:
+    """Fetch the user, and load every attribute on first access, like before"""
+    with app.session.database.managed_session() as session:
+        if not (user := users.fetch_by_name_case_insensitive(name, session)):
+            return
+
+        list(user.target_relationships)
+        list(user.relationships)
+        list(user.groups)
+        list(user.stats)
+        return user
+
+def fetch_eager(name: str) -> DBUser | None:
+    with app.session.database.managed_session() as session:
+        if not (user := client.fetch_user(name, session)):
+            return
+
+        list(user.groups)
+        list(user.stats)
+
+        client.id = user.id
+        client.update_relationships(session)
+        return user
+
+def measure(name: str, fetch: Callable, usernames: List[str], iterations: int) -> None:
+    latencies = []
+    start_queries = queries
+
+    for _ in range(iterations):
+        for username in usernames:
+            start = time.perf_counter()
+            fetch(username)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+
+    print(
+        f'{name:<6} {len(latencies)} fetches, '
+        f'{(queries - start_queries) / len(latencies):.1f} queries per fetch, '
+        f'p50 {statistics.median(latencies) * 1000:.2f}ms, '
+        f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms'
+    )
+
+def main() -> None:
+    args = sys.argv[1:]
+    iterations = 100
+
+    if '--iterations' in args:
+        index = args.index('--iterations')
+        iterations = int(args[index + 1])
+        del args[index:index + 2]
+
+    if not args:
+        print(__doc__)
+        return
+
+    # Also warms up the connection pool & database caches
+    for username in args:
+        if not fetch_eager(username):
+            print(f'User "{username}" was not found')
+            return
+
+    measure('lazy', fetch_lazy, args, iterations)
+    measure('eager', fetch_eager, args, iterations)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Simulates a reconnect storm after a restart: every client logs in at once,
+while the already connected clients keep sending packets through their mailbox.
+Compares packet latency between deferring every login to the thread pool
+right away, and the adaptive concurrency limit of the LoginManager.
+
+Usage: python -m benchmarks.login_storm [logins] [connected clients]
+"""
+
+from app.common.config import config_instance as config
+from app.tasks.logins import LoginManager
+from app.objects.mailbox import Mailbox
+from twisted.internet.defer import gatherResults
+from twisted.internet import reactor
+from typing import Callable, List
+
+import statistics
+import time
+import sys
+import app
+
+# Simulated login: database & redis round trips, and some cpu time
+LOGIN_IO_TIME = 0.05
+LOGIN_CPU_TIME = 0.005
+
+# Every connected client sends a packet at this interval
+PACKET_INTERVAL = 0.05
+
+def login() -> None:
+    time.sleep(LOGIN_IO_TIME)
+    end = time.thread_time() + LOGIN_CPU_TIME
+
+    while time.thread_time() < end:
+        pass
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[int(len(values) * fraction)] if values else 0.0
+
+def run(name: str, submit: Callable, manager: LoginManager | None, logins: int, clients: int, done: Callable) -> None:
+    latencies: List[float] = []
+    interval: List[float] = []
+    running = True
+
+    def handle_packets(packets: List[float]) -> None:
+        now = time.monotonic()
+        latencies.extend(now - sent_at for sent_at in packets)
+        interval.extend(now - sent_at for sent_at in packets)
+
+    mailboxes = [Mailbox(handle_packets) for _ in range(clients)]
+
+    def send_packets() -> None:
+        if not running:
+            return
+
+        for mailbox in mailboxes:
+            mailbox.put(time.monotonic())
+
+        reactor.callLater(PACKET_INTERVAL, send_packets)
+
+    def report() -> None:
+        nonlocal interval
+
+        if not running:
+            return
+
+        # Packets are still being added by the worker threads
+        samples, interval = interval, []
+
+        limit = f'limit {manager.limit:.1f}, waiting {len(manager.waiting)}, ' if manager else ''
+        latency = (
+            f'packet latency p99 {percentile(samples, 0.99) * 1000:.1f}ms'
+            if samples else 'no packets handled'
+        )
+        print(f'  {time.monotonic() - start:5.1f}s {limit}{latency}')
+        reactor.callLater(1, report)
+
+    def on_logins_done(results) -> None:
+        nonlocal running
+        running = False
+        elapsed = time.monotonic() - start
+
+        print(
+            f'{name:<8} {logins} logins in {elapsed:.2f}s, packet latency '
+            f'p50 {statistics.median(latencies) * 1000:.1f}ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f}ms, '
+            f'max {max(latencies) * 1000:.1f}ms'
+        )
+        done()
+
+    print(f'{name}:')
+    start = time.monotonic()
+    send_packets()
+    reactor.callLater(1, report)
+
+    deferreds = [submit(login) for _ in range(logins)]
+    gatherResults(deferreds).addCallback(on_logins_done)
+
+def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    reactor.suggestThreadPoolSize(config.BANCHO_WORKERS)
+    print(
+        f'{logins} logins with {clients} connected clients, '
+        f'{config.BANCHO_WORKERS} workers'
+    )
+
+    manager = LoginManager()
+
+    def run_limited() -> None:
+        # Start without the latency of the previous run
+        app.session.packet_latency.reset()
+        run('adaptive', manager.submit, manager, logins, clients, reactor.stop)
+
+    reactor.callWhenRunning(
+        run, 'deferred', app.session.tasks.defer_to_reactor_thread,
+        None, logins, clients, run_limited
+    )
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Simulates clients, that send their packets in separate chunks, and compares
+thread pool handoffs & ordering between deferring every chunk on its own and
+the per-client Mailbox.
+
+Usage: python -m benchmarks.mailbox [clients] [packets per client]
+"""
+
+from app.common.config import config_instance as config
+from app.objects.mailbox import Mailbox
+from twisted.internet import reactor
+from typing import Callable, Dict, List
+from threading import Lock
+
+import time
+import sys
+import app
+
+# Simulated work per packet, e.g. a redis call
+PACKET_WORK = 0.0002
+
+class Result:
+    def __init__(self) -> None:
+        self.last_sequence: Dict[int, int] = {}
+        self.reordered = 0
+        self.processed = 0
+        self.handoffs = 0
+        self.lock = Lock()
+
+    def handle(self, packets: List[tuple]) -> None:
+        for client_id, sequence in packets:
+            time.sleep(PACKET_WORK)
+
+            with self.lock:
+                if sequence < self.last_sequence.get(client_id, -1):
+                    self.reordered += 1
+
+                self.last_sequence[client_id] = sequence
+                self.processed += 1
+
+def deferred_receiver(result: Result) -> Callable:
+    """Every received chunk is deferred to the thread pool, like before the mailbox"""
+    def receive(client_id: int, sequence: int) -> None:
+        result.handoffs += 1
+        app.session.tasks.defer_to_reactor_thread(result.handle, [(client_id, sequence)])
+
+    return receive
+
+def mailbox_receiver(result: Result, clients: int) -> Callable:
+    mailboxes = [Mailbox(result.handle) for _ in range(clients)]
+
+    def receive(client_id: int, sequence: int) -> None:
+        mailboxes[client_id].put((client_id, sequence))
+
+    return receive
+
+def run(name: str, receive: Callable, result: Result, clients: int, packets: int, done: Callable) -> None:
+    total = clients * packets
+    handoffs = app.session.inbound_mailbox['handoffs']
+    start = time.perf_counter()
+
+    def deliver(sequence: int) -> None:
+        # One chunk per client & reactor iteration
+        for client_id in range(clients):
+            receive(client_id, sequence)
+
+        if sequence + 1 < packets:
+            reactor.callLater(0, deliver, sequence + 1)
+
+    def wait() -> None:
+        if result.processed < total:
+            reactor.callLater(0.01, wait)
+            return
+
+        result.handoffs += app.session.inbound_mailbox['handoffs'] - handoffs
+        elapsed = time.perf_counter() - start
+
+        print(
+            f'{name:<9} {result.handoffs / total:.3f} handoffs per packet, '
+            f'{result.reordered} reordered, {elapsed:.2f}s'
+        )
+        done()
+
+    deliver(0)
+    wait()
+
+def main() -> None:
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    packets = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    reactor.suggestThreadPoolSize(config.BANCHO_WORKERS)
+    print(f'{clients} clients with {packets} packets each, {config.BANCHO_WORKERS} workers')
+
+    deferred = Result()
+    mailbox = Result()
+
+    def run_mailbox() -> None:
+        run('mailbox', mailbox_receiver(mailbox, clients), mailbox, clients, packets, reactor.stop)
+
+    reactor.callWhenRunning(
+        run, 'deferred', deferred_receiver(deferred),
+        deferred, clients, packets, run_mailbox
+    )
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
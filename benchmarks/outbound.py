@@ -0,0 +1,55 @@
+"""
+Simulates a stalled spectator, whose outbound queue is at its budget, while
+spectator frames, stats & presences of other players keep being queued.
+Reports the cost per queued packet, and how many packets were dropped or coalesced.
+
+Usage: python -m benchmarks.outbound [packets]
+"""
+
+from app.objects.buffers import OutboundQueue, OUTBOUND_MAX_BYTES, OUTBOUND_MAX_PACKETS
+from chio import PacketType
+
+import random
+import time
+import sys
+import app
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+    random.seed(0)
+    # Mostly droppable packets, with a few chat messages in between
+    packets = [
+        random.choices((
+            (b'\x00' * 512, PacketType.BanchoSpectateFrames, None),
+            (b'\x00' * 64, PacketType.BanchoUserStats, random.randint(1, 1000)),
+            (b'\x00' * 32, PacketType.BanchoUserPresenceSingle, random.randint(1, 1000)),
+            (b'\x00' * 128, PacketType.BanchoMessage, None)
+        ), weights=(40, 40, 19, 1))[0]
+        for _ in range(count)
+    ]
+
+    queue = OutboundQueue(
+        max_bytes=OUTBOUND_MAX_BYTES,
+        max_packets=OUTBOUND_MAX_PACKETS
+    )
+    counters = app.session.outbound_budget.snapshot()
+
+    start = time.process_time()
+
+    for data, packet, key in packets:
+        queue.put(data, packet, key)
+
+    elapsed = time.process_time() - start
+    snapshot = app.session.outbound_budget.snapshot()
+
+    print(
+        f'{count} packets, {elapsed / count * 1e6:.2f}us cpu per packet, '
+        f'{snapshot["dropped"] - counters["dropped"]} dropped, '
+        f'{snapshot["coalesced"] - counters["coalesced"]} coalesced, '
+        f'{len(queue)} queued ({queue.size / 2**20:.1f}MB)'
+        + (', disconnected' if queue.overflowed else '')
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Resolves every !mp command for a user, and compares the permission checks of
+the command resolution: one permission lookup per candidate command, against
+the permissions, which a client resolves once per login. Reports the latency
+and the amount of permission lookups per resolved command.
+
+Usage: python -m benchmarks.permissions <user id> [iterations]
+"""
+
+from app.common.helpers import permissions
+from app.commands import Command, mp_commands
+from app.banchobot import BanchoBot
+from app.clients.base import Client
+from typing import Callable, List
+
+import statistics
+import time
+import sys
+import app
+
+lookups = 0
+lookup_permission = permissions.has_permission
+
+def count_lookup(*args, **kwargs) -> bool:
+    global lookups
+    lookups += 1
+    return lookup_permission(*args, **kwargs)
+
+# Count every lookup, including the ones of Client.has_permission
+permissions.has_permission = count_lookup
+
+def resolve(trigger: str, has_permission: Callable[[Command], bool]) -> Command | None:
+    """Resolve a command of the !mp set, like BanchoBot.resolve_command"""
+    for command in mp_commands.commands:
+        if trigger not in command.triggers:
+            continue
+
+        if not has_permission(command):
+            continue
+
+        return command
+
+def measure(name: str, has_permission: Callable[[Command], bool], triggers: List[str], iterations: int) -> None:
+    latencies = []
+    start_lookups = lookups
+
+    for _ in range(iterations):
+        for trigger in triggers:
+            start = time.perf_counter()
+            resolve(trigger, has_permission)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+
+    print(
+        f'{name:<7} {len(latencies)} commands, '
+        f'{(lookups - start_lookups) / len(latencies):.2f} lookups per command, '
+        f'p50 {statistics.median(latencies) * 1e6:.1f}us, '
+        f'p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f}us'
+    )
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    user_id = int(sys.argv[1])
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    triggers = [command.triggers[0] for command in mp_commands.commands]
+
+    # Commands & their permissions are collected by BanchoBot
+    app.session.banchobot = BanchoBot()
+
+    client = Client('127.0.0.1', 0)
+    client.id = user_id
+
+    start = time.perf_counter()
+    client.reload_permissions()
+    print(
+        f'Resolved {len(client.permission_cache)} permissions of user {user_id} '
+        f'in {(time.perf_counter() - start) * 1000:.2f}ms, once per login'
+    )
+
+    measure(
+        'lookup',
+        lambda command: count_lookup(
+            permission=command.permission,
+            user_id=user_id
+        ),
+        triggers, iterations
+    )
+    measure(
+        'cached',
+        lambda command: client.has_permission(command.permission),
+        triggers, iterations
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Simulates a login storm on top of many online players, and compares the time
+each login needs to get its presence bundle packets: walking every online
+player per login vs. the incrementally maintained PresenceBundle.
+
+Usage: python -m benchmarks.presence [online players] [logins]
+"""
+
+from app.objects.presence import PresenceBundle
+from chio import BanchoIO, PacketType
+from typing import Callable, List
+
+import statistics
+import random
+import chio
+import time
+import sys
+
+class SimulatedPlayer:
+    def __init__(self, id: int, io: BanchoIO, hidden: bool = False) -> None:
+        self.id = id
+        self.io = io
+        self.hidden = hidden
+
+def walk_players(players: List[SimulatedPlayer], player: SimulatedPlayer) -> List[bytes]:
+    """Encode the presence bundle by walking every player, as enqueue_presence_bundle does"""
+    chunk_size = 512
+    packets = []
+    chunk = []
+
+    for other in players:
+        if other.hidden and other != player:
+            continue
+
+        chunk.append(other)
+
+        if len(chunk) < chunk_size:
+            continue
+
+        packets.append(player.io.write_packet_to_bytes(PacketType.BanchoUserPresenceBundle, chunk))
+        chunk = []
+
+    if chunk:
+        packets.append(player.io.write_packet_to_bytes(PacketType.BanchoUserPresenceBundle, chunk))
+
+    return packets
+
+def storm(name: str, login: Callable, logins: List[SimulatedPlayer]) -> None:
+    latencies = []
+    start = time.perf_counter()
+
+    for player in logins:
+        login_start = time.perf_counter()
+        login(player)
+        latencies.append(time.perf_counter() - login_start)
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    print(
+        f'{name:<8} {elapsed:.2f}s total, '
+        f'p50 {statistics.median(latencies) * 1000:.3f}ms, '
+        f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms per login'
+    )
+
+def main() -> None:
+    online_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    login_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    random.seed(0)
+    io = chio.select_client(20130815)
+
+    # A few players are hidden, e.g. restricted ones
+    online = [
+        SimulatedPlayer(id, io, hidden=random.random() < 0.01)
+        for id in range(1, online_count + 1)
+    ]
+    logins = [
+        SimulatedPlayer(id, io)
+        for id in range(online_count + 1, online_count + login_count + 1)
+    ]
+    print(f'{login_count} logins with {online_count} online players')
+
+    players = list(online)
+
+    def login_walk(player: SimulatedPlayer) -> None:
+        players.append(player)
+        walk_players(players, player)
+
+    bundle = PresenceBundle()
+
+    for player in online:
+        bundle.add(player)
+
+    # Encode the bundle once, like the first login after a restart would
+    bundle.packets(online[0])
+
+    def login_bundle(player: SimulatedPlayer) -> None:
+        # Joining invalidates the last chunk, which is encoded again
+        bundle.add(player)
+        bundle.packets(player)
+
+    storm('walk', login_walk, logins)
+    storm('bundle', login_bundle, logins)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Feeds a stream of spectator frame packets through the inbound ByteStream,
+the same way TcpOsuClient.packetDataReceived reads it, and reports the cpu
+time per received MB and the peak of allocated memory.
+
+Usage: python -m benchmarks.streams [megabytes]
+"""
+
+from app.protocols.osu.streams import ByteStream
+from typing import List
+
+import tracemalloc
+import random
+import struct
+import time
+import sys
+
+# Packet header of b20121224+ clients: packet id, compression flag & size
+HEADER = struct.Struct('<HBI')
+HEADER_SIZE = HEADER.size
+
+# Packet id of OsuSpectateFrames, payloads are replay frame bundles
+SPECTATE_FRAMES = 18
+
+def generate_chunks(megabytes: float) -> List[bytes]:
+    """Split spectator frame packets into tcp segments of varying size"""
+    random.seed(0)
+    data = bytearray()
+
+    while len(data) < megabytes * 2**20:
+        payload = random.randbytes(random.randint(100, 4000))
+        data += HEADER.pack(SPECTATE_FRAMES, 0, len(payload))
+        data += payload
+
+    chunks = []
+    offset = 0
+
+    while offset < len(data):
+        size = random.choice((536, 1460, 1460, 2920, 16384, 65536))
+        chunks.append(bytes(data[offset:offset + size]))
+        offset += size
+
+    return chunks
+
+def receive(chunks: List[bytes]) -> int:
+    """Read all packets from the chunks, with the same reads as chio's read_packet"""
+    stream = ByteStream(None)
+    packets = 0
+
+    for chunk in chunks:
+        stream += chunk
+        consumed_offset = 0
+
+        try:
+            while stream.available() >= HEADER_SIZE:
+                struct.unpack('<H', stream.read(2))
+                stream.read(1)
+                size, = struct.unpack('<I', stream.read(4))
+                stream.read(size)
+
+                consumed_offset = stream.offset
+                packets += 1
+
+        except OverflowError:
+            # Wait for more data
+            stream.seek(consumed_offset)
+
+        finally:
+            stream.reset()
+
+    return packets
+
+def main() -> None:
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 64
+    chunks = generate_chunks(megabytes)
+    print(f'Receiving {megabytes}MB of spectator frames in {len(chunks)} chunks')
+
+    cpu_times = []
+
+    for _ in range(5):
+        start = time.process_time()
+        packets = receive(chunks)
+        cpu_times.append(time.process_time() - start)
+
+    tracemalloc.start()
+    receive(chunks)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f'{packets} packets, '
+        f'{min(cpu_times) / megabytes * 1000:.3f}ms cpu per MB, '
+        f'{peak / 1024:.1f}KB peak allocated'
+    )
+
+if __name__ == "__main__":
+    main()